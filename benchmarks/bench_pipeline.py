@@ -0,0 +1,172 @@
+"""Misst die Verarbeitungskette (Einlesen bis Diagramm) auf synthetischen KIM-Exporten.
+
+Für jede Skala (Vielfaches von daten.csv) und Variante (Trenner/Kodierung) wird
+eine Datei erzeugt und jede Stufe einzeln gemessen: Laufzeit (bestes von
+--wiederholungen) und Spitzenspeicher (tracemalloc). Ergebnis als JSON, damit
+Läufe vor/nach einer Änderung verglichen werden können.
+
+Beispiele:
+    python benchmarks/bench_pipeline.py --skala 10 100 1000 -o bench.json
+    python benchmarks/bench_pipeline.py --skala 10 100 --vergleich bench.json --toleranz 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import imker_kern as kern  # noqa: E402
+from kim_generator import schreibe_kim, profil  # noqa: E402
+
+try:
+    import resource
+    HAT_RESOURCE = True
+except ImportError:  # Windows
+    HAT_RESOURCE = False
+
+VARIANTEN = {
+    "komma-latin1": (",", "latin-1"),
+    "semikolon-utf8": (";", "utf-8"),
+}
+
+def miss(funktion, wiederholungen):
+    """Führt funktion() mehrfach aus; liefert (Ergebnis, beste Sekunden, Spitzenspeicher in Bytes)."""
+    zeiten = []
+    for _ in range(wiederholungen):
+        start = time.perf_counter()
+        ergebnis = funktion()
+        zeiten.append(time.perf_counter() - start)
+    # Speicher separat messen: tracemalloc bremst und würde die Zeiten verfälschen
+    tracemalloc.start()
+    funktion()
+    _, spitze = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ergebnis, min(zeiten), spitze
+
+def stufen(pfad):
+    """Die einzelnen Stufen der Kette in Ausführungsreihenfolge; jede baut auf der vorherigen auf."""
+    zwischen = {}
+
+    def format_erkennen():
+        return kern.erkenne_format(kern.lies_kopf(pfad))
+
+    def einlesen():
+        zwischen['roh'] = kern.lies_csv(pfad)
+        return zwischen['roh']
+
+    def normalisieren():
+        df, datum_format = zwischen['roh']
+        zwischen['df'] = kern.normalisiere_daten(df.copy(), datum_format)
+        return zwischen['df']
+
+    def stueckweise():
+        # Gleiches Ergebnis wie einlesen+normalisieren, Spitzenspeicher aber durch die Stückgröße begrenzt
+        return kern.lade_csv(pfad)
+
+    def voelker_sortieren():
+        # Register: natürliche Reihenfolge, Codes und Farben einmal je Datensatz
+        zwischen['voelker'] = kern.VolkRegister(zwischen['df']['Stockname']).namen
+        return zwischen['voelker']
+
+    def index_und_diff():
+        zwischen['daten'] = kern.Datensatz(zwischen['df'], pfad)
+        return zwischen['daten']
+
+    def diagramm():
+        ansicht = {"voelker": zwischen['voelker'], "metrik": "Gewicht", "zeit": "Alles anzeigen", "chart": "Liniendiagramm",
+                   "stauchung": False, "luecken": "Auslassen", "rohdaten": False}
+        return kern.baue_diagramm(zwischen['daten'], ansicht, pd.Timestamp.now().normalize())
+
+    def exportieren():
+        return kern.export_csv(zwischen['df'])
+
+    return [("format", format_erkennen), ("einlesen", einlesen), ("normalisieren", normalisieren),
+            ("stueckweise", stueckweise),
+            ("sortieren", voelker_sortieren), ("index_diff", index_und_diff), ("diagramm", diagramm),
+            ("export_csv", exportieren)]
+
+def umgebung():
+    import numpy
+    import plotly
+    return {
+        "python": platform.python_version(),
+        "plattform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": numpy.__version__,
+        "plotly": plotly.__version__,
+        "zeitpunkt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def max_rss():
+    if not HAT_RESOURCE:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux meldet KiB
+
+def vergleiche(alt, neu, toleranz):
+    """Liefert Meldungen für Stufen, die mehr als toleranz (relativ) langsamer geworden sind."""
+    alte = {(e['skala'], e['variante'], e['stufe']): e for e in alt['ergebnisse']}
+    meldungen = []
+    for e in neu['ergebnisse']:
+        vorher = alte.get((e['skala'], e['variante'], e['stufe']))
+        if vorher is None or vorher['sekunden'] <= 0:
+            continue
+        faktor = e['sekunden'] / vorher['sekunden']
+        if faktor > 1 + toleranz:
+            meldungen.append(f"{e['skala']}x {e['variante']} {e['stufe']}: "
+                             f"{vorher['sekunden']:.4f}s -> {e['sekunden']:.4f}s ({faktor:.2f}x)")
+    return meldungen
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Laufzeit und Speicher der Verarbeitungskette messen.")
+    parser.add_argument("--skala", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--variante", nargs="+", choices=list(VARIANTEN), default=list(VARIANTEN))
+    parser.add_argument("--wiederholungen", type=int, default=3)
+    parser.add_argument("-o", "--ausgabe", default="bench_ergebnis.json", help="JSON-Ausgabe")
+    parser.add_argument("--vergleich", help="früheres JSON-Ergebnis, gegen das verglichen wird")
+    parser.add_argument("--toleranz", type=float, default=0.25, help="erlaubte Verlangsamung (0.25 = 25 %%)")
+    parser.add_argument("--arbeitsordner", help="Ordner für die erzeugten CSVs (Standard: temporär)")
+    args = parser.parse_args(argv)
+
+    ergebnis = {"umgebung": umgebung(), "ergebnisse": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        ordner = args.arbeitsordner or tmp
+        os.makedirs(ordner, exist_ok=True)
+        for skala in args.skala:
+            for variante in args.variante:
+                trenner, kodierung = VARIANTEN[variante]
+                pfad = os.path.join(ordner, f"kim_{skala}x_{variante}.csv")
+                if not os.path.exists(pfad):
+                    schreibe_kim(pfad, skala, trenner, kodierung)
+                groesse = os.path.getsize(pfad)
+                for stufe, funktion in stufen(pfad):
+                    _, sekunden, spitze = miss(funktion, args.wiederholungen)
+                    ergebnis["ergebnisse"].append({
+                        "skala": skala, "variante": variante, "stufe": stufe,
+                        "zeilen": profil(skala)['zeilen'], "datei_bytes": groesse,
+                        "sekunden": round(sekunden, 6), "spitze_bytes": spitze,
+                    })
+                    print(f"{skala:>5}x {variante:<15} {stufe:<14} {sekunden * 1000:9.1f} ms {spitze / 2**20:8.1f} MB")
+    ergebnis["umgebung"]["max_rss_bytes"] = max_rss()
+
+    with open(args.ausgabe, "w", encoding="utf-8") as f:
+        json.dump(ergebnis, f, indent=2, ensure_ascii=False)
+    print(f"-> {args.ausgabe}")
+
+    if args.vergleich:
+        with open(args.vergleich, encoding="utf-8") as f:
+            meldungen = vergleiche(json.load(f), ergebnis, args.toleranz)
+        for m in meldungen:
+            print(f"⚠️ langsamer: {m}", file=sys.stderr)
+        return 1 if meldungen else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Misst den Kaltstart: wie lange frische Prozesse für die Importe bis zum Upload-Feld und bis zum ersten Diagramm brauchen.
+
+Jede Messung läuft in einem neuen Python-Prozess (nichts ist schon importiert).
+Gemeldet wird das Beste aus --wiederholungen, als Tabelle und als JSON.
+
+Beispiel:
+    python benchmarks/bench_start.py --wiederholungen 5 -o start.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+WURZEL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Jede Stufe: Python-Code, der nach den Importen die Sekunden seit Prozessbeginn ausgibt
+STUFEN = {
+    # Was das Dashboard vor dem Upload-Feld lädt
+    "bis_upload": "import streamlit, imker_messung",
+    # ... danach die Analyse (pandas, numpy, imker_kern – ohne Plotly)
+    "analyse": "import streamlit, imker_messung, imker_kern",
+    # ... und das erste Diagramm (erst hier wird plotly.express geladen)
+    "erstes_diagramm": (
+        "import streamlit, imker_kern, pandas as pd\n"
+        "d = imker_kern.Datensatz(imker_kern.lade_csv('daten.csv'), 'x')\n"
+        "imker_kern.baue_diagramm(d, {'voelker': d.register.namen[:2], 'metrik': 'Gewicht', 'zeit': 'Alles anzeigen',"
+        " 'chart': 'Liniendiagramm', 'stauchung': False, 'luecken': 'Auslassen', 'rohdaten': False},"
+        " pd.Timestamp.now().normalize())"
+    ),
+}
+
+PRUEFUNG = "\nimport sys, time\nprint(time.perf_counter() - START, 'plotly.express' in sys.modules)"
+
+def miss(code):
+    """(Sekunden seit Prozessbeginn, plotly.express geladen?) für einen frischen Prozess."""
+    programm = "import time\nSTART = time.perf_counter()\n" + code + PRUEFUNG
+    ausgabe = subprocess.run([sys.executable, "-c", programm], cwd=WURZEL, check=True,
+                             capture_output=True, text=True).stdout.split()
+    return float(ausgabe[-2]), ausgabe[-1] == "True"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kaltstart des Dashboards messen.")
+    parser.add_argument("--wiederholungen", type=int, default=3)
+    parser.add_argument("-o", "--ausgabe", help="JSON-Ausgabe")
+    args = parser.parse_args(argv)
+
+    ergebnisse = []
+    for stufe, code in STUFEN.items():
+        messungen = [miss(code) for _ in range(args.wiederholungen)]
+        sekunden = min(m[0] for m in messungen)
+        plotly = messungen[0][1]
+        ergebnisse.append({"stufe": stufe, "sekunden": round(sekunden, 4), "plotly_geladen": plotly})
+        print(f"{stufe:<16} {sekunden * 1000:8.1f} ms   plotly.express: {'ja' if plotly else 'nein'}")
+
+    if args.ausgabe:
+        with open(args.ausgabe, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "ergebnisse": ergebnisse}, f, indent=2, ensure_ascii=False)
+        print(f"-> {args.ausgabe}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Erzeugt realistische, synthetische KIM-Exporte für Lasttests.
+
+Gleiche 36 Spalten wie der echte Export, wahlweise mit ',' oder ';' und in
+latin-1 oder UTF-8. Milben und Gewicht sind wie im Original nur teilweise
+gefüllt, Notizen enthalten Kommas, Anführungszeichen und Zeilenumbrüche.
+
+Beispiel:
+    python benchmarks/kim_generator.py --skala 100 --trenner ";" --kodierung utf-8 -o kim_100x.csv
+"""
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+
+KIM_SPALTEN = [
+    "Datum des Eintrags", "Stockname", "Standortname", "Brutraumzargenformat", "Honigraumzargenformat",
+    "Beutentyp", "Stocktyp", "Position am Stand", "Notizen Stock", "Notizen Eintrag", "Sichtungen",
+    "Weiselzellen", "Bebrütete Waben", "Besetzte Waben", "Zählmethode", "Gezählte Milben",
+    "Zählzeitraum (Tage)", "Medikament", "Anwendungsmethode", "Biotechnische Maßnahme", "Medikamentenmenge",
+    "Behandlungsdauer", "Behandelnde Person", "Bewertung Volksstärke", "Bewertung Sanftmut",
+    "Bewertung Schwarmtrieb", "Bewertung Wabensitz", "Bewertung Futtermenge", "Ernte", "Ernte Rähmchenanzahl",
+    "Geerntete Menge (kg)", "Honigtyp", "Futtertyp", "Futtermenge", "Gewicht", "Wiegemethode",
+]
+
+BASIS_ZEILEN = 461  # so viele Einträge hat daten.csv
+BLOCK_ZEILEN = 50_000
+
+NOTIZEN = ["Flugkeil klein gestellt", "Windelschieber entfernt\nMäusegitter angebracht", "Zuckerwasser leer",
+           'Königin "Berta" gesichtet, markiert', "zurückliegend 5 sehr kalte Tage", ""]
+SICHTUNGEN = ["Stifte; Larven; Verdeckelte Brut", "Königin; Stifte; Larven", "Stifte; Larven; Verdeckelte Brut; Weiselzellen", ""]
+
+def profil(skala):
+    """Zeilen, Völker, Standorte und Jahre für eine Skala (1 = Größe von daten.csv)."""
+    voelker = 10 * math.ceil(math.sqrt(skala))
+    return {
+        'zeilen': BASIS_ZEILEN * skala,
+        'voelker': voelker,
+        'standorte': math.ceil(voelker / 20),
+        'jahre': 2 + round(math.log10(skala)) if skala >= 1 else 2,
+    }
+
+def erzeuge_block(rng, n, voelker, standorte, start, tage):
+    stock = rng.integers(1, voelker + 1, n)
+    datum = start + pd.to_timedelta(rng.integers(0, tage, n), unit='D') + pd.to_timedelta(rng.integers(0, 24 * 60, n), unit='min')
+    leer = np.full(n, "", dtype=object)
+    spalten = dict.fromkeys(KIM_SPALTEN, leer)
+
+    def teilweise(werte, anteil):
+        # Wie im echten Export: nur ein Teil der Einträge hat einen Wert
+        return np.where(rng.random(n) < anteil, werte, "")
+
+    spalten.update({
+        "Datum des Eintrags": datum.strftime('%d.%m.%y %H:%M'),
+        "Stockname": np.char.add("Volk ", stock.astype(str)),
+        "Standortname": np.char.add("Stand ", ((stock - 1) % standorte + 1).astype(str)),
+        "Brutraumzargenformat": np.full(n, "Zander", dtype=object),
+        "Beutentyp": np.full(n, "Liebig / Hohenheimer Einfachbeute", dtype=object),
+        "Stocktyp": rng.choice(["Wirtschaftsvolk", "Ableger"], n),
+        "Notizen Eintrag": rng.choice(NOTIZEN, n),
+        "Sichtungen": rng.choice(SICHTUNGEN, n),
+        "Zählmethode": teilweise("Gemülldiagnose", 0.5),
+        "Gezählte Milben": teilweise(rng.poisson(6, n).astype(str), 0.5),
+        "Zählzeitraum (Tage)": teilweise(rng.integers(1, 11, n).astype(str), 0.5),
+        "Bewertung Volksstärke": teilweise(rng.integers(0, 3, n).astype(float).astype(str), 0.1),
+        "Ernte": rng.choice(["Nein", "Ja"], n, p=[0.98, 0.02]),
+        "Gewicht": teilweise(np.round(rng.normal(25, 6, n), 2).astype(str), 0.3),
+        "Wiegemethode": teilweise("einseitig", 0.3),
+    })
+    return pd.DataFrame(spalten, columns=KIM_SPALTEN)
+
+def schreibe_kim(pfad, skala=1, trenner=",", kodierung="latin-1", seed=0):
+    """Schreibt einen synthetischen Export blockweise (Speicher bleibt klein) und liefert die Zeilenzahl."""
+    p = profil(skala)
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.now().normalize() - pd.DateOffset(years=p['jahre'])
+    tage = (pd.Timestamp.now().normalize() - start).days
+    geschrieben = 0
+    with open(pfad, 'w', encoding=kodierung, errors='replace', newline='') as f:
+        while geschrieben < p['zeilen']:
+            n = min(BLOCK_ZEILEN, p['zeilen'] - geschrieben)
+            block = erzeuge_block(rng, n, p['voelker'], p['standorte'], start, tage)
+            block.to_csv(f, sep=trenner, index=False, header=(geschrieben == 0))
+            geschrieben += n
+    return geschrieben
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetische KIM-Exporte erzeugen.")
+    parser.add_argument("-o", "--ausgabe", required=True, help="Zieldatei")
+    parser.add_argument("--skala", type=int, default=10, help="Vielfaches der Größe von daten.csv (z.B. 10, 100, 1000)")
+    parser.add_argument("--trenner", default=",", choices=[",", ";"])
+    parser.add_argument("--kodierung", default="latin-1", choices=["latin-1", "utf-8"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    zeilen = schreibe_kim(args.ausgabe, args.skala, args.trenner, args.kodierung, args.seed)
+    print(f"{args.ausgabe}: {zeilen} Einträge, {profil(args.skala)['voelker']} Völker")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1544 @@
+"""Kern der Imker-Analyse: KIM-Exporte einlesen, normalisieren und auswerten.
+
+Enthält keine Streamlit-Aufrufe; wird von meine-imkerei_app.py (Dashboard)
+und imker_report.py (Berichte ohne Oberfläche) gemeinsam genutzt.
+"""
+import os
+import re
+import io
+import csv
+import codecs
+import hashlib
+import json
+import threading
+import unicodedata
+import warnings
+from importlib.util import find_spec
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Optionale Pakete nur suchen, nicht importieren: das kostet beim Start spürbar Zeit
+HAT_PARQUET = find_spec("pyarrow") is not None  # nur für den Parquet-Snapshot nötig
+HAT_XLSX = find_spec("openpyxl") is not None    # nur für den .xlsx-Export nötig
+
+def plotly_express():
+    """plotly.express erst beim ersten Diagramm laden; bis dahin (Upload, Auswahl) wird es nicht gebraucht."""
+    import plotly.express as px
+    return px
+
+# 🟢 NEUE FARB-PALETTE (Maximaler Kontrast)
+FARB_POOL = [
+    ('#E6194B', '🔴'), # Signalrot
+    ('#3CB44B', '🟢'), # Sattes Grün
+    ('#FFE119', '🟡'), # Dunkelgelb / Gold
+    ('#4363D8', '🔵'), # Kräftiges Blau
+    ('#F58231', '🟠'), # Orange
+    ('#911EB4', '🟣'), # Lila / Violett
+    ('#42D4F4', '💧'), # Cyan / Türkis
+    ('#F032E6', '🌸'), # Magenta / Pink
+    ('#BFEF45', '🍏'), # Limettengrün
+    ('#A9A9A9', '🐘')  # Grau / Anthrazit
+]
+
+# Über den Pool hinaus: Farbtöne im goldenen Winkel, damit Nachbarn sich deutlich unterscheiden.
+# Das Icon folgt dem Farbton (Quadrat der Farbfamilie) und trägt eine laufende Nummer -> eindeutig
+FARBTON_EMOJIS = [(15, '🟥'), (45, '🟧'), (70, '🟨'), (170, '🟩'), (260, '🟦'), (345, '🟪'), (360, '🟥')]
+
+def farbe_fuer(nummer):
+    """(farb_code, icon) für die n-te Farbe; die ersten kommen aus FARB_POOL."""
+    if nummer < len(FARB_POOL):
+        return FARB_POOL[nummer]
+    zusatz = nummer - len(FARB_POOL)
+    farbton = (zusatz * 137.508 + 20) % 360
+    emoji = next(e for grenze, e in FARBTON_EMOJIS if farbton < grenze)
+    return f"hsl({farbton:.0f},75%,{55 + 10 * (zusatz % 2)}%)", f"{emoji}{zusatz + 1}"
+
+def farb_zuordnung(namen):
+    """(color_map, emoji_map) in der Reihenfolge der Namen."""
+    color_map = {}
+    emoji_map = {}
+    for idx, name in enumerate(namen):
+        color_map[name], emoji_map[name] = farbe_fuer(idx)
+    return color_map, emoji_map
+
+# Namen wiederholen sich ständig (Sortieren, Tabellen, Standorte) -> Schlüssel nur einmal zerlegen
+@lru_cache(maxsize=4096)
+def natural_sort_key(s): return tuple(int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', str(s)))
+
+ZEITRAUM_TAGE = {"Letzte 7 Tage": 7, "Letzte 14 Tage": 14, "Letzte 30 Tage": 30, "Letzte 3 Monate": 90, "Letzte 6 Monate": 180}
+
+def zeitfenster(auswahl, heute):
+    """(start_date, end_date, filter_ende) für die Zeitraum-Auswahl. start_date None = alles."""
+    start_date = None
+    end_date = heute + pd.Timedelta(days=1) 
+    filter_ende = None
+
+    if auswahl in ZEITRAUM_TAGE:
+        start_date = heute - pd.Timedelta(days=ZEITRAUM_TAGE[auswahl])
+    elif auswahl.isdigit(): 
+        wahl_jahr = int(auswahl)
+        start_date = pd.Timestamp(year=wahl_jahr, month=1, day=1)
+        end_date = pd.Timestamp(year=wahl_jahr, month=12, day=31)
+        filter_ende = pd.Timestamp(year=wahl_jahr + 1, month=1, day=1)
+    return start_date, end_date, filter_ende
+
+# --- CACHE ---
+class LRUCache:
+    """Begrenzter Zwischenspeicher: verdrängt den am längsten ungenutzten Eintrag."""
+    def __init__(self, max_eintraege, max_bytes=None):
+        self.max_eintraege = max_eintraege
+        self.max_bytes = max_bytes
+        self._daten = OrderedDict()
+        self._groessen = {}
+        self._lock = threading.Lock()
+        self.belegt = 0
+        self.treffer = 0
+        self.fehlschlaege = 0
+
+    def hole(self, schluessel):
+        with self._lock:
+            if schluessel in self._daten:
+                self._daten.move_to_end(schluessel)
+                self.treffer += 1
+                return self._daten[schluessel]
+            self.fehlschlaege += 1
+            return None
+
+    def lege_ab(self, schluessel, wert, groesse=0):
+        with self._lock:
+            self.belegt -= self._groessen.pop(schluessel, 0)
+            self._daten[schluessel] = wert
+            self._daten.move_to_end(schluessel)
+            self._groessen[schluessel] = groesse
+            self.belegt += groesse
+            while len(self._daten) > self.max_eintraege or (
+                    self.max_bytes and self.belegt > self.max_bytes and len(self._daten) > 1):
+                alt, _ = self._daten.popitem(last=False)
+                self.belegt -= self._groessen.pop(alt)
+
+def datei_stand(pfad):
+    # Änderungszeit + Größe; None wenn die Datei (noch) nicht existiert
+    try:
+        info = os.stat(pfad)
+    except FileNotFoundError:
+        return None
+    return [info.st_mtime_ns, info.st_size]
+
+# --- EINLESEN (Format einmal erkennen, dann genau ein Durchlauf) ---
+KOPF_BYTES = 64 * 1024
+
+# KIM-Spalte -> Name im Dashboard. Alle anderen Spalten werden gar nicht erst eingelesen.
+SPALTEN = {
+    "Datum des Eintrags": "Datum des Eintrags",
+    "Stockname": "Stockname",
+    "Standortname": "Standortname",
+    "Gewicht": "Gewicht",
+    "Gezählte Milben": "Milben_Count",
+    "Zählzeitraum (Tage)": "Milben_Days",
+    "Bewertung Volksstärke": "Bewertung Volksstärke",
+    "Notizen Eintrag": "Notizen Eintrag",
+}
+ZAHL_SPALTEN = ["Gewicht", "Gezählte Milben", "Zählzeitraum (Tage)", "Bewertung Volksstärke"]
+
+def spalten_schluessel(name):
+    """Vergleichsform eines Spaltennamens: gleich für 'Bebrütete', 'BebrÃ¼tete' und 'Bebr�tete'."""
+    name = unicodedata.normalize('NFC', name.strip().lstrip('\ufeff'))
+    try:
+        name = name.encode('latin-1').decode('utf-8')  # UTF-8, das als latin-1 gelesen wurde
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        pass
+    return re.sub(r'[^\x00-\x7f]', '?', name)
+
+SPALTEN_NACH_SCHLUESSEL = {spalten_schluessel(k): v for k, v in SPALTEN.items()}
+ZAHL_ZIELE = {SPALTEN[k] for k in ZAHL_SPALTEN}
+DATUM_FORMATE = ["%d.%m.%y %H:%M", "%d.%m.%Y %H:%M", "%d.%m.%y", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+
+def erkenne_format(kopf):
+    """Bestimmt Kodierung, Trenner, Dezimalzeichen und Datumsformat aus den ersten Bytes der Datei."""
+    kodierung = 'utf-8-sig' if kopf.startswith(codecs.BOM_UTF8) else 'utf-8'
+    try:
+        # final=False: ein am Block-Ende abgeschnittenes Zeichen ist kein Fehler
+        text = codecs.getincrementaldecoder(kodierung)().decode(kopf, final=False)
+    except UnicodeDecodeError:
+        kodierung = 'latin-1'
+        text = kopf.decode(kodierung)
+
+    erste_zeile = text.split('\n', 1)[0]
+    trenner = max([',', ';', '\t'], key=erste_zeile.count)
+
+    zeilen = list(csv.reader(io.StringIO(text), delimiter=trenner))
+    if len(kopf) >= KOPF_BYTES: zeilen = zeilen[:-1]  # letzte Zeile ist evtl. abgeschnitten
+    kopfzeile = zeilen[0] if zeilen else []
+    namen = [spalten_schluessel(k) for k in kopfzeile]
+
+    def proben(name):
+        name = spalten_schluessel(name)
+        if name not in namen: return []
+        i = namen.index(name)
+        return [z[i].strip() for z in zeilen[1:] if len(z) > i and z[i].strip()]
+
+    dezimal = '.'
+    if any(re.fullmatch(r'-?\d+,\d+', w) for name in ZAHL_SPALTEN for w in proben(name)):
+        dezimal = ','
+
+    datum_format = None
+    datum_proben = proben("Datum des Eintrags")
+    for fmt in DATUM_FORMATE:
+        try:
+            for w in datum_proben: datetime.strptime(w, fmt)
+        except ValueError:
+            continue
+        if datum_proben: datum_format = fmt
+        break
+
+    return {'encoding': kodierung, 'sep': trenner, 'decimal': dezimal,
+            'datum_format': datum_format, 'kopfzeile': kopfzeile}
+
+def lies_kopf(quelle):
+    if hasattr(quelle, 'read'):
+        quelle.seek(0)
+        kopf = quelle.read(KOPF_BYTES)
+        quelle.seek(0)
+        return kopf
+    with open(quelle, 'rb') as f:
+        return f.read(KOPF_BYTES)
+
+def lese_optionen(fmt):
+    """(read_csv-Argumente, Umbenennung) für ein erkanntes Format; nur die Dashboard-Spalten."""
+    # Spaltennamen so wie sie in der Datei stehen (evtl. mit Leerzeichen/falschen Umlauten) -> Dashboard-Name
+    umbenennung = {k: SPALTEN_NACH_SCHLUESSEL[spalten_schluessel(k)] for k in fmt['kopfzeile']
+                   if spalten_schluessel(k) in SPALTEN_NACH_SCHLUESSEL}
+    if "Datum des Eintrags" not in umbenennung.values():
+        raise ValueError("Spalte 'Datum des Eintrags' fehlt.")
+
+    # Alles als Text lesen: eine kaputte Zelle ("ca. 5") darf nicht das ganze Einlesen scheitern lassen
+    optionen = dict(sep=fmt['sep'], encoding=fmt['encoding'], usecols=list(umbenennung),
+                    dtype={k: 'str' for k in umbenennung})
+    return optionen, umbenennung
+
+def dashboard_spalten(df, umbenennung, dezimal='.'):
+    """Umbenennen und Zahlenspalten umwandeln; was keine Zahl ist, wird leer (NaN)."""
+    df = df.rename(columns=umbenennung)
+    df = df.loc[:, ~df.columns.duplicated()]
+    for c in ZAHL_ZIELE & set(df.columns):
+        text = df[c].str.strip()
+        if dezimal != '.': text = text.str.replace(dezimal, '.', regex=False)
+        df[c] = pd.to_numeric(text, errors='coerce')
+    return df
+
+def lies_roh(quelle, fmt):
+    """pd.read_csv mit den Optionen des Formats. Ein Nicht-UTF-8-Byte hinter dem Dateianfang
+    (Format nur aus den ersten Bytes erkannt) -> noch einmal als latin-1."""
+    optionen, _ = lese_optionen(fmt)
+    try:
+        return pd.read_csv(quelle, **optionen)
+    except UnicodeDecodeError:
+        if fmt['encoding'] == 'latin-1': raise
+        if hasattr(quelle, 'seek'): quelle.seek(0)
+        return pd.read_csv(quelle, **{**optionen, 'encoding': 'latin-1'})
+
+def lies_csv(quelle, fmt=None):
+    # fmt vorgeben, wenn nur ein Ausschnitt gelesen wird (dessen Anfang sagt wenig über die Datei)
+    fmt = fmt or erkenne_format(lies_kopf(quelle))
+    _, umbenennung = lese_optionen(fmt)
+    return dashboard_spalten(lies_roh(quelle, fmt), umbenennung, fmt['decimal']), fmt['datum_format']
+
+# --- METRIKEN ---
+# Button-Beschriftung -> Spalte
+METRIKEN = {"Gewicht": "Gewicht", "Zunahme/Abnahme": "Gewicht_Diff", "Varroa (Milben/Tag)": "Milben", "Volksstärke": "Bewertung Volksstärke",
+            "Varroa Ø 7 Tage": "Varroa_7T", "Gewicht seit Saisonbeginn": "Gewicht_Saison"}
+
+# Spalte -> (Schwelle, Hinweis). Liegt der letzte Wert eines Volks darüber, gibt es eine Warnung.
+ALARM_SCHWELLEN = {
+    "Milben": (10.0, "Milbenfall über 10/Tag – Behandlung prüfen"),
+    "Varroa_7T": (10.0, "Milbenfall im 7-Tage-Mittel über 10/Tag – Behandlung prüfen"),
+}
+
+def milben_pro_tag(anzahl, tage):
+    # Bei Tagen: Wenn leer oder 0, nehmen wir 1 an (um 'Teilen durch 0' zu verhindern)
+    d = tage.fillna(1).replace(0, 1)
+    return anzahl / d
+
+def eintrag_ids(stock, zeitpunkt, notizen=None):
+    """64-Bit-Kennung je Eintrag aus (Volk, Zeitpunkt, Notiz); gleich für denselben Eintrag in zwei Exporten."""
+    if notizen is None:
+        notizen = pd.Series("", index=stock.index)
+    teile = pd.DataFrame({
+        'stock': stock.astype(str).str.strip(),
+        # Einheit festlegen: je nach Datumsformat liefert pandas s/ms/us
+        'zeit': zeitpunkt.astype('datetime64[ns]').to_numpy().view('int64'),
+        'notiz': notizen.fillna("").astype(str).str.replace('\r\n', '\n').str.strip(),
+    }, index=stock.index)
+    return pd.util.hash_pandas_object(teile, index=False)
+
+# Verlaufswerte: wie weit ein Eintrag zurückschauen muss (Fenster bzw. Saisonbeginn am 1. Januar)
+TREND_FENSTER = "7D"
+
+def saison_beginn(datum):
+    return pd.Timestamp(year=datum.year, month=1, day=1)
+
+def trend_spalten(df):
+    """Abgeleitete Verlaufswerte für eine nach (Volk, Datum) sortierte Tabelle – alle Völker in einem Durchgang.
+
+    Gewicht_Diff: Differenz zum vorherigen Eintrag. Gewicht_Saison: Gewicht minus erstes Gewicht
+    des Jahres. Varroa_7T: Milben / Zähltage über die letzten 7 Tage (nur an Zähltagen).
+    """
+    ergebnis = pd.DataFrame(index=df.index)
+    volk = df['Stockname']
+    if 'Gewicht' in df.columns:
+        ergebnis['Gewicht_Diff'] = df.groupby(volk, observed=True)['Gewicht'].diff()
+        saison = [volk, df['Datum des Eintrags'].dt.year]
+        ergebnis['Gewicht_Saison'] = df['Gewicht'] - df.groupby(saison, observed=True)['Gewicht'].transform('first')
+    if 'Milben_Count' in df.columns and 'Milben_Days' in df.columns:
+        gezaehlt = df['Milben_Count'].notna()
+        fenster = pd.DataFrame({
+            'Stockname': volk, 'Datum': df['Datum des Eintrags'],
+            'milben': df['Milben_Count'].astype('float64'),
+            'tage': df['Milben_Days'].fillna(1).replace(0, 1).where(gezaehlt).astype('float64'),
+        })
+        # Gruppen kommen in Kategorie-Reihenfolge zurück = Sortierung von df
+        summen = fenster.groupby('Stockname', observed=True).rolling(TREND_FENSTER, on='Datum')[['milben', 'tage']].sum()
+        varroa = summen['milben'].to_numpy() / summen['tage'].to_numpy()
+        ergebnis['Varroa_7T'] = np.where(gezaehlt, varroa, np.nan).astype('float32')
+    return ergebnis
+
+def normalisiere_daten(df, datum_format=None):
+    # 🟢 VARROA BERECHNUNG (Milben / Tage)
+    if 'Milben_Count' in df.columns and 'Milben_Days' in df.columns:
+        df['Milben'] = milben_pro_tag(df['Milben_Count'], df['Milben_Days'])
+
+    roh = df['Datum des Eintrags']
+    if datum_format:
+        datum = pd.to_datetime(roh, format=datum_format, errors='coerce')
+        # Das Format stammt vom Dateianfang; spätere Zeilen in anderer Schreibweise einzeln nachparsen
+        rest = datum.isna() & roh.notna()
+        if rest.any():
+            datum = datum.astype('datetime64[ns]')
+            datum[rest] = pd.to_datetime(roh[rest], format='mixed', dayfirst=True, errors='coerce')
+        df['Datum des Eintrags'] = datum
+    else:
+        df['Datum des Eintrags'] = pd.to_datetime(roh, dayfirst=True, errors='coerce')
+    # Kennung vor dem Abschneiden der Uhrzeit; die Notiz selbst wird danach nicht mehr gebraucht
+    df['Eintrag_ID'] = eintrag_ids(df['Stockname'], df['Datum des Eintrags'], df.get('Notizen Eintrag'))
+    df = df.drop(columns='Notizen Eintrag', errors='ignore')
+    df['Datum des Eintrags'] = df['Datum des Eintrags'].dt.normalize()
+    
+    df = df.dropna(subset=['Datum des Eintrags', 'Stockname'])
+    return kompaktiere(df)
+
+# Kompaktes Schema (gleich für CSV und Snapshot): Kategorien statt Texten, float32 statt float64
+KATEGORIE_SPALTEN = ["Stockname", "Standortname"]
+METRIK_SPALTEN = ["Gewicht", "Milben_Count", "Milben_Days", "Milben", "Bewertung Volksstärke"]
+
+def kompaktiere(df):
+    typen = {c: 'category' for c in KATEGORIE_SPALTEN if c in df.columns}
+    typen.update({c: 'float32' for c in METRIK_SPALTEN if c in df.columns})
+    df = df.astype(typen).reset_index(drop=True)
+    # Kategorien in natürlicher Reihenfolge: Codes sortieren dann wie "Volk 2" < "Volk 10"
+    for c in KATEGORIE_SPALTEN:
+        if c in df.columns:
+            kategorien = df[c].cat.remove_unused_categories().cat.categories
+            df[c] = df[c].cat.set_categories(sorted(kategorien, key=natural_sort_key))
+    return df
+
+# --- STÜCKWEISE (große Dateien: Speicherbedarf wächst mit dem Stück, nicht mit der Datei) ---
+STUECK_ZEILEN = 50_000
+
+def lies_stueckweise(quelle, fmt=None, zeilen=STUECK_ZEILEN):
+    """Liest die CSV in Stücken zu `zeilen` Zeilen; liefert jedes Stück schon normalisiert und kompakt."""
+    fmt = fmt or erkenne_format(lies_kopf(quelle))
+    _, umbenennung = lese_optionen(fmt)
+
+    def stuecke(fmt):
+        if hasattr(quelle, 'seek'): quelle.seek(0)
+        optionen, _ = lese_optionen(fmt)
+        with pd.read_csv(quelle, chunksize=zeilen, **optionen) as leser:
+            yield from leser
+
+    def fertig(stueck):
+        return normalisiere_daten(dashboard_spalten(stueck, umbenennung, fmt['decimal']), fmt['datum_format'])
+
+    geliefert = 0
+    try:
+        for stueck in stuecke(fmt):
+            yield fertig(stueck)
+            geliefert += len(stueck)
+    except UnicodeDecodeError:
+        if fmt['encoding'] == 'latin-1': raise
+        # Nicht-UTF-8-Byte erst hinter dem Dateianfang: von vorn als latin-1, schon gelieferte Zeilen überspringen
+        for stueck in stuecke({**fmt, 'encoding': 'latin-1'}):
+            if geliefert >= len(stueck):
+                geliefert -= len(stueck)
+                continue
+            yield fertig(stueck.iloc[geliefert:])
+            geliefert = 0
+
+def verbinde_stuecke(stuecke):
+    """Hängt kompakte Stücke aneinander, ohne die Kategorien zwischendurch wieder in Texte zu verwandeln."""
+    stuecke = list(stuecke)
+    if len(stuecke) == 1:
+        return stuecke[0]
+    if not stuecke:
+        # Nur Kopfzeile: leere Tabelle mit dem üblichen Schema
+        return normalisiere_daten(dashboard_spalten(pd.DataFrame({c: pd.Series(dtype='str') for c in SPALTEN.values()}), {}))
+    for c in KATEGORIE_SPALTEN:
+        if c in stuecke[0].columns:
+            alle = pd.api.types.union_categoricals([s[c] for s in stuecke]).categories
+            stuecke = [s.assign(**{c: s[c].cat.set_categories(alle)}) for s in stuecke]
+    return kompaktiere(pd.concat(stuecke, ignore_index=True))
+
+def lade_csv(quelle):
+    """Ganze CSV als kompakte Tabelle, stückweise gelesen (nie die ganze Rohdatei als DataFrame)."""
+    return verbinde_stuecke(lies_stueckweise(quelle))
+
+# --- SNAPSHOT (Parquet-Ordner neben daten.csv, wird nur ergänzt) ---
+SNAPSHOT_META = "_stand.json"
+SNAPSHOT_MAX_TEILE = 16
+SNAPSHOT_VERSION = 2  # 2: Teile enthalten Eintrag_ID (ältere werden einmal aus der CSV neu gebaut)
+
+def snapshot_pfad(csv_pfad):
+    return os.path.splitext(csv_pfad)[0] + ".parquet"
+
+# Ein Schreiber zur Zeit (alle Sitzungen/Threads eines Prozesses)
+_SNAPSHOT_LOCK = threading.Lock()
+
+def lies_snapshot_meta(ordner):
+    try:
+        with open(os.path.join(ordner, SNAPSHOT_META), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def schreibe_snapshot_meta(ordner, meta):
+    ziel = os.path.join(ordner, SNAPSHOT_META)
+    with open(ziel + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(ziel + ".tmp", ziel)
+
+def snapshot_vorhanden(csv_pfad):
+    return HAT_PARQUET and lies_snapshot_meta(snapshot_pfad(csv_pfad)) is not None
+
+def snapshot_schreibbar(csv_pfad):
+    """Kann der Snapshot angelegt bzw. ergänzt werden? (schreibgeschützter App-Ordner -> nur die CSV lesen)"""
+    if not HAT_PARQUET:
+        return False
+    ordner = snapshot_pfad(csv_pfad)
+    return os.access(ordner if os.path.isdir(ordner) else os.path.dirname(os.path.abspath(ordner)), os.W_OK)
+
+def neue_eintraege(bestand_ids, neu):
+    """Zeilen aus `neu`, deren Eintrag noch nicht gespeichert ist. Abgleich über Eintrag_ID
+    (Volk, voller Zeitpunkt, Notiz) – ein zweiter Eintrag am selben Tag ist ein neuer Eintrag."""
+    return neu[~neu['Eintrag_ID'].isin(bestand_ids)]
+
+def gespeicherte_ids(ordner, teile):
+    """Eintrag_IDs aller Teile. Teile älterer Versionen ohne ID bekommen eine aus Volk und Tag."""
+    import pyarrow.parquet as pq
+    ids = []
+    for name in teile:
+        pfad = os.path.join(ordner, name)
+        if 'Eintrag_ID' in pq.read_schema(pfad).names:
+            ids.append(pd.read_parquet(pfad, columns=['Eintrag_ID'])['Eintrag_ID'])
+        else:
+            alt = pd.read_parquet(pfad, columns=['Stockname', 'Datum des Eintrags'])
+            ids.append(eintrag_ids(alt['Stockname'], alt['Datum des Eintrags']))
+    return pd.concat(ids, ignore_index=True) if ids else pd.Series(dtype='uint64')
+
+def naechster_teil(meta):
+    # Fortlaufende Nummer, nie wiederverwendet: gleiche Teile-Liste heißt gleicher Inhalt
+    nummer = meta.get('naechster', len(meta['teile']))
+    meta['naechster'] = nummer + 1
+    return f"teil-{nummer:05d}.parquet"
+
+def schreibe_teil(ziel, stuecke):
+    """Schreibt die Stücke nacheinander als Row-Groups einer Parquet-Datei; liefert die Zeilenzahl.
+    Ohne Zeilen entsteht keine Datei."""
+    import pyarrow
+    import pyarrow.parquet as pq
+    schreiber, schema, anzahl = None, None, 0
+    try:
+        for stueck in stuecke:
+            if not len(stueck): continue
+            # Kategorien als Text: jedes Stück hat eigene Kategorien, die Datei braucht ein festes Schema
+            stueck = stueck.astype({c: 'str' for c in KATEGORIE_SPALTEN if c in stueck.columns})
+            tabelle = pyarrow.Table.from_pandas(stueck, schema=schema, preserve_index=False)
+            if schreiber is None:
+                schema = tabelle.schema
+                schreiber = pq.ParquetWriter(ziel + ".tmp", schema)
+            schreiber.write_table(tabelle)
+            anzahl += len(stueck)
+    finally:
+        if schreiber is not None: schreiber.close()
+    if anzahl:
+        os.replace(ziel + ".tmp", ziel)
+    elif os.path.exists(ziel + ".tmp"):
+        os.remove(ziel + ".tmp")
+    return anzahl
+
+def bereinige_uebernommen(ordner, meta, csv_ids):
+    """Nimmt aus den übernommenen Teilen die Einträge heraus, die inzwischen in der CSV stehen (die CSV gilt).
+    Passt meta an; liefert die Dateien, die nach dem Schreiben der Meta gelöscht werden können."""
+    weg = []
+    for name in list(meta.get('uebernommen', [])):
+        pfad = os.path.join(ordner, name)
+        if not pd.read_parquet(pfad, columns=['Eintrag_ID'])['Eintrag_ID'].isin(csv_ids).any():
+            continue
+        rest = neue_eintraege(csv_ids, pd.read_parquet(pfad))
+        neu = naechster_teil(meta)
+        ersatz = [neu] if schreibe_teil(os.path.join(ordner, neu), [rest]) else []
+        for liste in (meta['teile'], meta['uebernommen']):
+            i = liste.index(name)
+            liste[i:i + 1] = ersatz
+        weg.append(name)
+    return weg
+
+def fasse_zusammen(ordner, meta, namen):
+    # Viele kleine Teile machen das Lesen langsam -> einmal zu einem zusammenfassen
+    gesamt = naechster_teil(meta)
+    lies_teile(ordner, namen).to_parquet(os.path.join(ordner, "gesamt.tmp"), index=False)
+    os.replace(os.path.join(ordner, "gesamt.tmp"), os.path.join(ordner, gesamt))
+    return gesamt
+
+def haenge_an_snapshot(ordner, neu, quelle=None, fortsetzung=None, abgleichen=True, uebernommen=False):
+    """Schreibt neue Einträge als eigenes Teilstück; bestehende Teile bleiben unangetastet.
+    `neu`: Tabelle oder Folge von Stücken (lies_stueckweise), die einzeln in dasselbe Teilstück gehen.
+    `fortsetzung`: bis wohin die CSV gelesen wurde (siehe lies_anhang).
+    `abgleichen=False`: `neu` ist sicher neu (angehängte CSV-Zeilen), nichts wird herausgefiltert.
+    `uebernommen=True`: Einträge aus einem Upload, die nicht in der CSV stehen – sie werden in der Meta
+    vermerkt und überstehen einen Neuaufbau aus der CSV (baue_snapshot_neu)."""
+    stuecke = [neu] if isinstance(neu, pd.DataFrame) else neu
+    meta = lies_snapshot_meta(ordner)
+    weg = []
+    if meta is None:
+        os.makedirs(ordner, exist_ok=True)
+        meta = {'teile': [], 'quelle': None, 'version': SNAPSHOT_VERSION}
+    elif meta['teile'] and abgleichen:
+        bestand_ids = gespeicherte_ids(ordner, meta['teile'])
+        stuecke = (neue_eintraege(bestand_ids, s) for s in stuecke)
+    elif meta.get('uebernommen'):
+        stuecke = list(stuecke)
+        weg = bereinige_uebernommen(ordner, meta, pd.concat([s['Eintrag_ID'] for s in stuecke]))
+
+    name = naechster_teil(meta)
+    anzahl = schreibe_teil(os.path.join(ordner, name), stuecke)
+    if anzahl:
+        meta['teile'].append(name)
+        if uebernommen: meta.setdefault('uebernommen', []).append(name)
+
+    if len(meta['teile']) > SNAPSHOT_MAX_TEILE:
+        # Übernommene Teile für sich, damit sie erkennbar bleiben
+        aus_upload = meta.get('uebernommen', [])
+        aus_csv = [n for n in meta['teile'] if n not in aus_upload]
+        teile = []
+        for gruppe in (aus_csv, aus_upload):
+            if len(gruppe) > 1:
+                weg += gruppe
+                gruppe = [fasse_zusammen(ordner, meta, gruppe)]
+            teile += gruppe
+        meta['teile'] = teile
+        if aus_upload: meta['uebernommen'] = teile[-1:]
+
+    if quelle is not None: meta['quelle'] = quelle
+    if fortsetzung is not None: meta['fortsetzung'] = fortsetzung
+    schreibe_snapshot_meta(ordner, meta)
+    for name in weg: os.remove(os.path.join(ordner, name))
+    return anzahl
+
+def lies_teile(ordner, teile, columns=None):
+    # Nur die in der Meta-Datei eingetragenen Teile lesen (keine halb geschriebenen Reste)
+    if not teile:
+        leer = verbinde_stuecke([])  # CSV ohne Einträge: leere Tabelle mit dem üblichen Schema
+        return leer[columns] if columns else leer
+    dfs = [pd.read_parquet(os.path.join(ordner, name), columns=columns) for name in teile]
+    return kompaktiere(pd.concat(dfs, ignore_index=True))
+
+# --- ANHANG (wächst die CSV nur hinten, werden nur die neuen Bytes gelesen) ---
+PRUEF_BYTES = 64
+
+ENDE_BLOCK_BYTES = 1024 * 1024
+
+def satz_ende(puffer, anfuehrungen_davor=0):
+    """Position hinter dem letzten vollständigen Datensatz: letzter Zeilenumbruch außerhalb von Anführungszeichen.
+    puffer muss an einem Satzanfang beginnen (oder `anfuehrungen_davor` sagt, wie viele " schon davor lagen)."""
+    b = np.frombuffer(puffer, dtype=np.uint8)
+    umbrueche = np.flatnonzero(b == ord('\n'))
+    if not len(umbrueche):
+        return 0
+    # "" innerhalb eines Feldes zählt doppelt und ändert die Parität nicht
+    anfuehrungen = np.cumsum(b == ord('"'))[umbrueche] + anfuehrungen_davor
+    aussen = umbrueche[anfuehrungen % 2 == 0]
+    return int(aussen[-1]) + 1 if len(aussen) else 0
+
+def satz_ende_datei(f, groesse):
+    """satz_ende für die ersten `groesse` Bytes einer Datei, blockweise (nie die ganze Datei im Speicher)."""
+    f.seek(0)
+    ende = gelesen = anfuehrungen = 0
+    while gelesen < groesse:
+        block = f.read(min(ENDE_BLOCK_BYTES, groesse - gelesen))
+        if not block: break
+        im_block = satz_ende(block, anfuehrungen)
+        if im_block: ende = gelesen + im_block
+        anfuehrungen += block.count(b'"')
+        gelesen += len(block)
+    return ende
+
+class Dateianfang(io.RawIOBase):
+    """Nur die ersten `laenge` Bytes einer offenen Datei; was dahinter gerade geschrieben wird, bleibt unsichtbar."""
+    def __init__(self, f, laenge):
+        self.f, self.laenge, self.pos = f, laenge, 0
+
+    def readable(self): return True
+    def seekable(self): return True
+    def tell(self): return self.pos
+
+    def seek(self, pos, woher=os.SEEK_SET):
+        basis = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: self.laenge}[woher]
+        self.pos = min(max(0, basis + pos), self.laenge)
+        return self.pos
+
+    def readinto(self, puffer):
+        self.f.seek(self.pos)
+        daten = self.f.read(min(len(puffer), self.laenge - self.pos))
+        puffer[:len(daten)] = daten
+        self.pos += len(daten)
+        return len(daten)
+
+def pruefsumme(puffer):
+    return hashlib.sha1(puffer).hexdigest()
+
+def fortsetzung_fuer(pfad, offset):
+    """Merkt sich, bis wohin gelesen wurde, und woran eine umgeschriebene Datei zu erkennen ist."""
+    with open(pfad, 'rb') as f:
+        kopfzeile = f.readline()
+        f.seek(max(0, offset - PRUEF_BYTES))
+        ende = f.read(min(offset, PRUEF_BYTES))
+    return {'offset': offset, 'kopf': pruefsumme(kopfzeile), 'ende': pruefsumme(ende)}
+
+def lies_anhang(pfad, fortsetzung):
+    """Liest nur die seit `fortsetzung` angehängten, vollständigen Datensätze.
+
+    Liefert (df, neue_fortsetzung) – df None, wenn noch kein Satz vollständig ist – oder None, wenn
+    die Datei gekürzt oder umgeschrieben wurde (dann muss sie ganz gelesen werden).
+    Ein halb geschriebener letzter Satz bleibt für den nächsten Aufruf liegen.
+    """
+    if not fortsetzung:
+        return None
+    offset = fortsetzung['offset']
+    with open(pfad, 'rb') as f:
+        kopfzeile = f.readline()
+        f.seek(0, os.SEEK_END)
+        groesse = f.tell()
+        # Nicht gewachsen, aber geändert (sonst käme man nicht hierher): an Ort und Stelle umgeschrieben
+        if groesse <= offset or pruefsumme(kopfzeile) != fortsetzung['kopf']:
+            return None
+        f.seek(max(0, offset - PRUEF_BYTES))
+        if pruefsumme(f.read(min(offset, PRUEF_BYTES))) != fortsetzung['ende']:
+            return None
+        anhang = f.read(groesse - offset)
+    fertig = satz_ende(anhang)
+    if fertig == 0:
+        return None, fortsetzung
+    fmt = erkenne_format(lies_kopf(pfad))
+    df = normalisiere_daten(*lies_csv(io.BytesIO(kopfzeile + anhang[:fertig]), fmt))
+    return df, fortsetzung_fuer(pfad, offset + fertig)
+
+def baue_snapshot_neu(ordner, pfad, stand):
+    """Snapshot komplett aus der CSV: neue Teile und neue Meta, danach werden die alten Teile gelöscht.
+    Übernommene Einträge (Upload) bleiben erhalten, soweit sie nicht inzwischen in der CSV stehen."""
+    alt = lies_snapshot_meta(ordner) or {'teile': []}
+    # Ältere Versionen vermerken übernommene Teile nicht (und ihnen fehlt die Eintrag_ID)
+    uebernommen = alt.get('uebernommen', []) if alt.get('version') == SNAPSHOT_VERSION else []
+    meta = {'teile': [], 'quelle': stand, 'version': SNAPSHOT_VERSION,
+            'naechster': alt.get('naechster', len(alt['teile']))}
+    os.makedirs(ordner, exist_ok=True)
+    name = naechster_teil(meta)
+    with open(pfad, 'rb') as f:
+        # Nur bis zum Stand lesen und dort nur vollständige Sätze: was während des Aufbaus
+        # angehängt wird, holt der nächste Anhang-Lauf genau einmal
+        ende = satz_ende_datei(f, stand[1]) or stand[1]  # nur Kopfzeile ohne Zeilenumbruch
+        if schreibe_teil(os.path.join(ordner, name), lies_stueckweise(io.BufferedReader(Dateianfang(f, ende)))):
+            meta['teile'].append(name)
+    meta['fortsetzung'] = fortsetzung_fuer(pfad, ende)
+    if uebernommen:
+        meta['uebernommen'] = list(uebernommen)
+        csv_ids = gespeicherte_ids(ordner, meta['teile'])
+        meta['teile'] += uebernommen
+        bereinige_uebernommen(ordner, meta, csv_ids)
+    schreibe_snapshot_meta(ordner, meta)
+    for name in alt['teile']:
+        if name in meta['teile']: continue
+        try:
+            os.remove(os.path.join(ordner, name))
+        except FileNotFoundError:
+            pass
+
+def aktualisiere_snapshot(pfad):
+    """Bringt den Snapshot auf den Stand der CSV (nur wenn sie sich geändert hat); liefert die Teile.
+    Wurde nur angehängt, werden nur die neuen Bytes gelesen, sonst die ganze Datei."""
+    ordner = snapshot_pfad(pfad)
+    with _SNAPSHOT_LOCK:
+        stand = datei_stand(pfad)
+        meta = lies_snapshot_meta(ordner)
+        if stand is not None and meta is not None and meta.get('version') != SNAPSHOT_VERSION:
+            baue_snapshot_neu(ordner, pfad, stand)  # Teile ohne Eintrag_ID
+        elif stand is not None and (meta is None or meta['quelle'] != stand):
+            anhang = lies_anhang(pfad, meta.get('fortsetzung')) if meta else None
+            if anhang is not None and anhang[0] is None:
+                meta['quelle'] = stand  # nur ein unvollständiger Satz dazugekommen
+                schreibe_snapshot_meta(ordner, meta)
+            elif anhang is not None:
+                # Die Zeilen hinter dem alten Ende sind neu, auch wenn sie einem Eintrag gleichen
+                haenge_an_snapshot(ordner, anhang[0], quelle=stand, fortsetzung=anhang[1], abgleichen=False)
+            else:
+                # Neu, gekürzt oder umgeschrieben: Korrekturen und Löschungen gelten -> alles neu aufbauen
+                baue_snapshot_neu(ordner, pfad, stand)
+        return lies_snapshot_meta(ordner)['teile']
+
+def lade_basisdaten(pfad):
+    """Basis-Daten aus dem Snapshot; die CSV wird nur gelesen, wenn sie sich geändert hat.
+    Lässt sich der Snapshot nicht schreiben (kein Schreibrecht, Platte voll), direkt aus der CSV."""
+    if not HAT_PARQUET:
+        return lade_csv(pfad)
+    try:
+        teile = aktualisiere_snapshot(pfad)
+    except OSError:
+        return lade_csv(pfad)
+    return lies_teile(snapshot_pfad(pfad), teile)
+
+def uebernimm_in_basisdaten(pfad, df):
+    if os.path.exists(pfad):
+        aktualisiere_snapshot(pfad)  # erst auf den Stand der CSV bringen (auch ältere Versionen)
+    with _SNAPSHOT_LOCK:
+        return haenge_an_snapshot(snapshot_pfad(pfad), df, uebernommen=True)
+
+def quell_schluessel(quelle):
+    # Upload: Hash über den Inhalt. Basis-Datei: Stand von CSV und Snapshot (kein Einlesen nötig)
+    if hasattr(quelle, 'getvalue'):
+        return "upload:" + hashlib.sha256(quelle.getvalue()).hexdigest()
+    meta = os.path.join(snapshot_pfad(quelle), SNAPSHOT_META)
+    return f"datei:{os.path.abspath(quelle)}:{datei_stand(quelle)}:{datei_stand(meta)}"
+
+# --- ZUSAMMENFÜHREN (mehrere Exporte, jeder Eintrag nur einmal) ---
+class Zusammenfuehrung:
+    """Exporte nacheinander zusammenführen. Jede neue Datei wird nur gegen den Index der
+    bisherigen Kennungen geprüft; bei doppelten Einträgen gewinnt die zuerst hinzugefügte Datei."""
+    def __init__(self):
+        self.quellen = []
+        self.doppelt = 0
+        self._ids = np.empty(0, dtype='uint64')  # sortiert
+        self._teile = []
+        self._df = None
+
+    def hinzufuegen(self, df, schluessel):
+        """Übernimmt aus einem normalisierten DataFrame die noch unbekannten Einträge; liefert deren Anzahl."""
+        if schluessel in self.quellen:
+            return 0
+        ids = df['Eintrag_ID'].to_numpy()
+        neu = np.zeros(len(ids), dtype=bool)
+        neu[np.unique(ids, return_index=True)[1]] = True  # innerhalb der Datei: erstes Vorkommen
+        neu &= ~np.isin(ids, self._ids, assume_unique=False)
+        self._ids = np.union1d(self._ids, ids[neu])
+        self._teile.append(df[neu])
+        self._df = None
+        self.quellen.append(schluessel)
+        self.doppelt += int(len(ids) - neu.sum())
+        return int(neu.sum())
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = kompaktiere(pd.concat(self._teile, ignore_index=True)) if self._teile else None
+        return self._df
+
+    @property
+    def schluessel(self):
+        return zusammen_schluessel(self.quellen)
+
+def zusammen_schluessel(quell_schluessel_liste):
+    return "zusammen:" + hashlib.sha256("|".join(quell_schluessel_liste).encode()).hexdigest()
+
+def fuehre_zusammen(quellen, bisher=None, schluessel=None):
+    """Zusammenführung aller Quellen (Pfade oder Uploads, in dieser Reihenfolge).
+
+    Beginnen die Quellen mit denen von `bisher`, wird dieses Objekt weiterverwendet
+    und nur die hinzugekommenen Dateien werden gelesen.
+    """
+    schluessel = schluessel or [quell_schluessel(q) for q in quellen]
+    if bisher is None or bisher.quellen != schluessel[:len(bisher.quellen)]:
+        bisher = Zusammenfuehrung()
+    for quelle, s in zip(quellen, schluessel):
+        if s not in bisher.quellen:
+            bisher.hinzufuegen(lade_csv(quelle), s)
+    return bisher
+
+# --- INDEX (einmal pro Datensatz: jedes Volk als sortierter Block) ---
+def block_grenzen(werte):
+    """(anfaenge, enden) der Abschnitte gleicher Werte in einem sortierten Array."""
+    grenzen = np.flatnonzero(werte[1:] != werte[:-1]) + 1
+    return np.r_[0, grenzen], np.r_[grenzen, len(werte)]
+
+def fenster(datum, a, e, start=None, ende=None):
+    """(von, bis) der Zeilen a..e mit start <= Datum < ende; datum[a:e] ist sortiert -> Binärsuche statt Filter."""
+    block = datum[a:e]
+    von = np.searchsorted(block, np.datetime64(start)) if start is not None else 0
+    bis = np.searchsorted(block, np.datetime64(ende)) if ende is not None else len(block)
+    return a + von, a + bis
+
+def zeilen_aus(daten, bereiche):
+    """Zeilen aus (von, bis)-Bereichen: ein Bereich ohne Kopie, mehrere mit einer einzigen."""
+    bereiche = [(von, bis) for von, bis in bereiche if bis > von]
+    if not bereiche:
+        return daten.iloc[:0]
+    if len(bereiche) == 1:
+        return daten.iloc[bereiche[0][0]:bereiche[0][1]]
+    return daten.take(np.concatenate([np.arange(von, bis) for von, bis in bereiche]))
+
+class VolkIndex:
+    """Alle Einträge nach (Volk, Datum) sortiert; jedes Volk liegt als zusammenhängender Block vor.
+
+    Jeder Block ist zusätzlich nach Saison (Jahr ab saison_beginn) unterteilt: vorhandene Jahre und
+    Jahresbereiche kommen aus den Grenzen, ohne die Datumsspalte erneut zu durchlaufen.
+    """
+    def __init__(self, df, trends=True):
+        daten = df.sort_values(['Stockname', 'Datum des Eintrags'], kind='stable').reset_index(drop=True)
+        # Verlaufswerte über die ganze Historie, nicht nur im sichtbaren Fenster
+        if trends:
+            daten = pd.concat([daten, trend_spalten(daten)], axis=1)
+        self.daten = daten
+        self.datum = daten['Datum des Eintrags'].to_numpy()
+
+        codes = daten['Stockname'].cat.codes.to_numpy()
+        anfaenge, enden = block_grenzen(codes)
+        namen = daten['Stockname'].cat.categories
+        self.bloecke = {namen[codes[a]]: (a, e) for a, e in zip(anfaenge, enden) if e > a}
+
+        # Saison-Grenzen je Block: erstes/letztes Datum stehen an den Blockenden
+        self.saisons, self.jahre = {}, []
+        if self.bloecke:
+            erstes = pd.Timestamp(self.datum[anfaenge].min())
+            letztes = pd.Timestamp(self.datum[enden - 1].max())
+            jahre = np.arange(erstes.year, letztes.year + 2)
+            # Saison = Kalenderjahr (wie saison_beginn und die Jahresauswahl in zeitfenster)
+            anfang = (jahre - 1970).astype('datetime64[Y]').astype(self.datum.dtype)
+            belegt = np.zeros(len(jahre) - 1, dtype=bool)
+            for volk, (a, e) in self.bloecke.items():
+                grenzen = a + np.searchsorted(self.datum[a:e], anfang)
+                self.saisons[volk] = dict(zip(jahre[:-1].tolist(), zip(grenzen[:-1], grenzen[1:])))
+                belegt |= grenzen[1:] > grenzen[:-1]
+            self.jahre = jahre[:-1][belegt].tolist()
+
+    def auswahl(self, voelker, start=None, ende=None):
+        """Einträge der Völker mit start <= Datum < ende (beide Grenzen optional).
+
+        Ein Volk: Ausschnitt der gemeinsamen Tabelle ohne Kopie. Mehrere: eine einzige Kopie.
+        """
+        return zeilen_aus(self.daten, [fenster(self.datum, *self.bloecke[v], start, ende)
+                                       for v in voelker if v in self.bloecke])
+
+    def saison(self, voelker, jahr):
+        """Einträge der Völker in einer Saison – direkt aus den Saison-Grenzen."""
+        return zeilen_aus(self.daten, [self.saisons[v][jahr] for v in voelker
+                                       if v in self.saisons and jahr in self.saisons[v]])
+
+    def ergaenze(self, neu):
+        """Neuer Index mit zusätzlichen Einträgen. Verlaufswerte werden nur für Völker mit neuen
+        Einträgen neu berechnet, und nur ab dem ersten neuen Datum (plus nötigem Vorlauf)."""
+        alles = kompaktiere(pd.concat([self.daten, neu], ignore_index=True))
+        index = VolkIndex(alles, trends=False)
+        erste_neue = neu.groupby('Stockname', observed=True)['Datum des Eintrags'].min()
+
+        kontext, ziel, versatz = [], [], 0
+        for volk, erstes in erste_neue.items():
+            a, e = index.bloecke[volk]
+            block = index.datum[a:e]
+            ab = a + np.searchsorted(block, np.datetime64(erstes))
+            vorlauf = min(erstes - pd.Timedelta(TREND_FENSTER), saison_beginn(erstes))
+            # eine Zeile mehr für die Differenz zum vorherigen Eintrag
+            von = max(a, a + np.searchsorted(block, np.datetime64(vorlauf)) - 1)
+            kontext.append(np.arange(von, e))
+            ziel.append(np.arange(ab, e) - von + versatz)
+            versatz += e - von
+        if kontext:
+            kontext, ziel = np.concatenate(kontext), np.concatenate(ziel)
+            werte = trend_spalten(index.daten.take(kontext).reset_index(drop=True))
+            for spalte in werte.columns:
+                spalte_neu = index.daten[spalte].to_numpy(copy=True)
+                spalte_neu[kontext[ziel]] = werte[spalte].to_numpy()[ziel]
+                index.daten[spalte] = spalte_neu
+        return index
+
+class VolkRegister:
+    """Alle Völker eines Datensatzes, einmal beim Laden festgelegt.
+
+    Reihenfolge, Code und Farbe hängen nur vom Namen ab, nicht von der Auswahl:
+    ein Volk behält seine Farbe, egal in welcher Reihenfolge geklickt wird.
+    """
+    def __init__(self, stockname):
+        # Kategorien stehen schon in natürlicher Reihenfolge (kompaktiere) -> Code = Rang
+        self.namen = list(stockname.cat.categories)
+        self.code = {name: i for i, name in enumerate(self.namen)}
+        self.farben, self.emojis = farb_zuordnung(self.namen)
+
+    def sortiert(self, voelker):
+        """Völker in natürlicher Reihenfolge, unbekannte am Ende."""
+        return sorted(voelker, key=lambda v: self.code.get(v, len(self.namen)))
+
+class Datensatz:
+    """Normalisierte Daten einer Quelle plus alles, was pro Datensatz nur einmal berechnet wird."""
+    def __init__(self, df, schluessel, volk_index=None):
+        self.df = df
+        self.schluessel = schluessel
+        self.volk_index = volk_index if volk_index is not None else VolkIndex(df)
+        self.register = VolkRegister(self.volk_index.daten['Stockname'])
+        self.standorte = StandortUebersicht(self.volk_index.daten)
+
+    def ergaenze(self, neu, schluessel):
+        """Neuer Datensatz mit zusätzlichen Einträgen; der Index wird fortgeschrieben statt neu gebaut."""
+        return Datensatz(kompaktiere(pd.concat([self.df, neu], ignore_index=True)), schluessel,
+                         self.volk_index.ergaenze(neu))
+
+class GeteilteBasisdaten:
+    """Der Datensatz der Basis-Datei, einmal pro Prozess für alle Sitzungen.
+
+    Neu geladen wird nur, wenn sich Stand (mtime/Größe) von CSV oder Snapshot ändert;
+    der alte Datensatz wird dann nicht mehr referenziert und freigegeben. Sitzungen,
+    die gleichzeitig einen geänderten Stand sehen, warten auf dasselbe Einlesen.
+    Der Datensatz wird nur gelesen, nie verändert.
+    """
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self._lock = threading.Lock()
+        self._daten = None
+        self._teile = None
+        self.ladevorgaenge = 0
+
+    def hole(self):
+        """Liefert (datensatz, aus_cache)."""
+        daten = self._daten
+        if daten is not None and daten.schluessel == quell_schluessel(self.pfad):
+            return daten, True
+        with self._lock:
+            daten = self._daten
+            if daten is not None and daten.schluessel == quell_schluessel(self.pfad):
+                return daten, True  # eine andere Sitzung hat gerade geladen
+            try:
+                teile = aktualisiere_snapshot(self.pfad) if HAT_PARQUET else None
+            except OSError:
+                teile = None  # Snapshot nicht schreibbar -> wie ohne pyarrow die CSV lesen
+            if teile is None:
+                self._daten = Datensatz(lade_csv(self.pfad), quell_schluessel(self.pfad))
+                self._teile = None
+            else:
+                # Schlüssel erst danach: der Snapshot kann gerade erst entstanden sein
+                schluessel = quell_schluessel(self.pfad)
+                ordner = snapshot_pfad(self.pfad)
+                if daten is not None and self._teile and teile[:len(self._teile)] == self._teile:
+                    # Nur angehängt -> nur die neuen Teile lesen und den Index fortschreiben
+                    neu = teile[len(self._teile):]
+                    if neu:
+                        self._daten = daten.ergaenze(lies_teile(ordner, neu), schluessel)
+                    else:
+                        self._daten = Datensatz(daten.df, schluessel, daten.volk_index)
+                else:
+                    self._daten = Datensatz(lies_teile(ordner, teile), schluessel)
+                self._teile = list(teile)
+            self.ladevorgaenge += 1
+            return self._daten, False
+
+# --- STANDORTE (Tageswerte je Standort, einmal pro Datensatz berechnet) ---
+OHNE_STANDORT = "Ohne Standort"
+STAERKE_KLASSEN = {0: "Schwach", 1: "Normal", 2: "Stark"}
+
+class StandortUebersicht:
+    """Zuordnung Volk -> Standort und Tageswerte je Standort (ein Eintrag pro Standort und Tag)."""
+    def __init__(self, daten):
+        standort = (daten['Standortname'].astype(object).fillna(OHNE_STANDORT)
+                    if 'Standortname' in daten.columns else pd.Series(OHNE_STANDORT, index=daten.index))
+        werte = [c for c in ["Gewicht", "Gewicht_Diff", "Gewicht_Saison", "Milben", "Varroa_7T",
+                             "Bewertung Volksstärke"] if c in daten.columns]
+        f = daten[['Stockname', 'Datum des Eintrags'] + werte].assign(Standort=standort.to_numpy())
+
+        # Letzter bekannter Standort je Volk (Index ist nach Volk, Datum sortiert)
+        zuordnung = f.groupby('Stockname', observed=True)['Standort'].last()
+        self.voelker = {s: sorted(v.index, key=natural_sort_key) for s, v in zuordnung.groupby(zuordnung)}
+        self.namen = sorted(self.voelker, key=natural_sort_key)
+
+        # Erst je Volk und Tag mitteln (mehrere Einträge am Tag zählen einfach), dann je Standort
+        pro_volk = f.groupby(['Standort', 'Datum des Eintrags', 'Stockname'], observed=True)[werte].mean().reset_index()
+        agg = {'Voelker': ('Stockname', 'nunique')}
+        if 'Gewicht' in werte:
+            agg.update(Gewicht_mittel=('Gewicht', 'mean'), Gewicht_median=('Gewicht', 'median'),
+                       Gewicht_min=('Gewicht', 'min'), Gewicht_max=('Gewicht', 'max'))
+        for spalte in ["Gewicht_Diff", "Gewicht_Saison", "Varroa_7T", "Bewertung Volksstärke"]:
+            if spalte in werte: agg[spalte] = (spalte, 'mean')
+        if 'Milben' in werte:
+            agg.update(Milben=('Milben', 'sum'), Milben_Voelker=('Milben', 'count'))
+        if 'Bewertung Volksstärke' in werte:
+            klasse = pro_volk['Bewertung Volksstärke'].round()
+            for wert, name in STAERKE_KLASSEN.items():
+                pro_volk[f"Staerke_{name}"] = (klasse == wert).astype('int32')
+                agg[f"Staerke_{name}"] = (f"Staerke_{name}", 'sum')
+        tage = pro_volk.groupby(['Standort', 'Datum des Eintrags'], sort=True).agg(**agg)
+        if 'Milben' in tage.columns:
+            # Summe über keine Zählung ist "keine Angabe", nicht 0
+            tage['Milben'] = tage['Milben'].where(tage.pop('Milben_Voelker') > 0)
+        self.tage = tage.reset_index()
+        # Nach (Standort, Datum) sortiert -> je Standort ein Block
+        self._datum = self.tage['Datum des Eintrags'].to_numpy()
+        self._bloecke = list(zip(*block_grenzen(self.tage['Standort'].to_numpy()))) if len(self.tage) else []
+
+    def ausschnitt(self, start=None, ende=None):
+        """Tageswerte aller Standorte mit start <= Datum < ende (Binärsuche je Standort)."""
+        return zeilen_aus(self.tage, [fenster(self._datum, a, e, start, ende) for a, e in self._bloecke])
+
+# --- LÜCKEN (je Volk: Lücken erkennen, leere Werte nach Wahl füllen) ---
+# Auswahl im Dashboard -> Verfahren
+LUECKEN_POLITIK = {"Auslassen": None, "Als 0": "null", "Letzten Wert halten": "halten", "Interpolieren": "interpolieren"}
+LUECKE_MIN_TAGE = 14    # kürzere Pausen sind nie eine Lücke
+LUECKE_FAKTOR = 4       # ... längere nur, wenn sie deutlich über dem üblichen Abstand des Volks liegen
+
+def erkenne_luecken(plot_df):
+    """Bool-Array: True, wo vor dem Eintrag eine Lücke liegt. plot_df je Volk nach Datum sortiert."""
+    datum = plot_df['Datum des Eintrags']
+    abstand = datum.groupby(plot_df['Stockname'], observed=True).diff()
+    ueblich = abstand.groupby(plot_df['Stockname'], observed=True).transform('median')
+    grenze = (ueblich * LUECKE_FAKTOR).clip(lower=pd.Timedelta(days=LUECKE_MIN_TAGE))  # NaT bei nur einem Eintrag
+    return (abstand > grenze).to_numpy()
+
+def fuelle_luecken(plot_df, y_spalte, politik, luecken=None):
+    """Füllt leere Werte je Volk und Abschnitt (nie über eine erkannte Lücke hinweg).
+
+    politik: None (nichts), "null", "halten" (letzter Wert) oder "interpolieren" (linear über die Zeit).
+    Alle Völker in einem gruppierten Durchgang.
+    """
+    if politik is None:
+        return plot_df
+    if politik == "null":
+        return plot_df.assign(**{y_spalte: plot_df[y_spalte].fillna(0)})
+    if luecken is None:
+        luecken = erkenne_luecken(plot_df)
+    # Abschnitt = Volk + Anzahl Lücken bis hierher
+    codes = plot_df['Stockname'].cat.codes.to_numpy()
+    abschnitt = pd.Series(luecken.astype('int64'), index=plot_df.index).groupby(codes).cumsum().to_numpy()
+    gruppen = [codes, abschnitt]
+    werte = plot_df[y_spalte].astype('float64')
+    vorher = werte.groupby(gruppen).ffill()
+    if politik == "halten":
+        return plot_df.assign(**{y_spalte: vorher})
+
+    # Linear: vorigen und nächsten gemessenen Wert samt Zeitpunkt je Abschnitt holen
+    zeit = plot_df['Datum des Eintrags'].astype('datetime64[ns]').astype('int64').astype('float64')
+    zeit_gemessen = zeit.where(werte.notna())
+    t0 = zeit_gemessen.groupby(gruppen).ffill()
+    t1 = zeit_gemessen.groupby(gruppen).bfill()
+    nachher = werte.groupby(gruppen).bfill()
+    anteil = ((zeit - t0) / (t1 - t0)).where(t1 > t0, 0.0)
+    return plot_df.assign(**{y_spalte: werte.fillna(vorher + (nachher - vorher) * anteil)})
+
+def trennstellen(plot_df, luecken):
+    """Je Lücke eine Zeile (Volk, Mitte der Lücke). Aus den echten Einträgen bestimmt, damit eine
+    Verdichtung keine Lücken erzeugt, die es in den Daten nicht gibt."""
+    davor = plot_df['Datum des Eintrags'].groupby(plot_df['Stockname'], observed=True).shift()
+    trenner = plot_df.loc[luecken, ['Stockname']].copy()
+    trenner['Datum des Eintrags'] = (davor[luecken] + (plot_df['Datum des Eintrags'][luecken] - davor[luecken]) / 2).dt.normalize()
+    return trenner
+
+def unterbrich_an_luecken(plot_df, y_spalte, trenner):
+    """Fügt an jeder Trennstelle eine leere Zeile ein -> die Linie wird dort unterbrochen."""
+    if trenner.empty:
+        return plot_df
+    return pd.concat([plot_df, trenner.assign(**{y_spalte: np.nan})]).sort_values(['Datum des Eintrags', 'Stockname'], kind='stable')
+
+def stauchungs_achse(datum, max_beschriftungen=20):
+    """Gestauchte Zeitachse: Position je Datum (0..n-1) plus wenige Beschriftungen (Positionen, Texte)."""
+    tage = np.unique(datum.to_numpy())
+    position = np.searchsorted(tage, datum.to_numpy())
+    schritt = max(1, int(np.ceil(len(tage) / max_beschriftungen)))
+    ticks = np.arange(0, len(tage), schritt)
+    texte = pd.DatetimeIndex(tage[ticks]).strftime('%d.%m.%y')
+    return position, len(tage), ticks, list(texte)
+
+# --- VERDICHTUNG (begrenzte Punktzahl pro Diagramm, egal wie lang die Historie ist) ---
+DIAGRAMM_BREITE_PX = 1400   # typische Diagrammbreite im "wide"-Layout
+PIXEL_PRO_PUNKT = 4
+MAX_PUNKTE_GESAMT = 6000
+VERDICHTUNG_STUFEN = [("D", 1, "Tagesmittel"), ("W", 7, "Wochenmittel"), ("M", 30.4, "Monatsmittel"),
+                      ("Q", 91.3, "Quartalsmittel"), ("Y", 365.25, "Jahresmittel")]
+
+LTTB_MIN_PUNKTE = 50        # darunter trägt die Kurvenform nicht mehr -> Linien zeigen Zeitraum-Mittel
+
+def punkte_budget(anzahl_voelker, breite=DIAGRAMM_BREITE_PX):
+    # Mehr Punkte pro Volk als Pixel sind nicht sichtbar; bei vielen Völkern zählt die Gesamtzahl
+    return max(1, min(breite // PIXEL_PRO_PUNKT, MAX_PUNKTE_GESAMT // max(anzahl_voelker, 1)))
+
+def lttb_indizes(x, y, n):
+    """Largest-Triangle-Three-Buckets: Indizes von n Punkten, die den Kurvenverlauf erhalten."""
+    laenge = len(x)
+    if n >= laenge or n < 3:
+        return np.arange(laenge)
+    kanten = np.linspace(1, laenge - 1, n - 1).astype(int)
+    auswahl = [0]
+    a = 0
+    for i in range(n - 2):
+        von, bis = kanten[i], kanten[i + 1]
+        naechste_bis = kanten[i + 2] if i + 2 < len(kanten) else laenge
+        mitte_x = x[bis:naechste_bis].mean()
+        mitte_y = y[bis:naechste_bis].mean()
+        flaeche = np.abs((x[a] - mitte_x) * (y[von:bis] - y[a]) - (x[a] - x[von:bis]) * (mitte_y - y[a]))
+        a = von + int(np.argmax(flaeche))
+        auswahl.append(a)
+    auswahl.append(laenge - 1)
+    return np.array(auswahl)
+
+def verdichte(plot_df, y_spalte, chart_typ, budget, start=None, ende=None):
+    """Höchstens `budget` Punkte pro Volk. Liefert (df, beschreibung); beschreibung None = Rohdaten."""
+    if plot_df.groupby('Stockname', observed=True).size().max() <= budget:
+        return plot_df, None
+
+    if chart_typ == "Liniendiagramm" and budget >= LTTB_MIN_PUNKTE:
+        teile = []
+        for _, gruppe in plot_df.groupby('Stockname', observed=True, sort=False):
+            x = gruppe['Datum des Eintrags'].to_numpy().astype('int64').astype('float64')
+            y = gruppe[y_spalte].to_numpy(dtype='float64')
+            teile.append(gruppe.iloc[lttb_indizes(x, y, budget)])
+        return pd.concat(teile).sort_values(['Datum des Eintrags', 'Stockname']), "Kurvenform-erhaltend ausgedünnt"
+
+    # Balken (und Linien bei sehr vielen Völkern): Mittelwert pro Zeitraum, Min/Max als Fehlerbalken.
+    # Stufe nach sichtbarem Fenster, so grob, dass das Budget (und damit MAX_PUNKTE_GESAMT) hält.
+    von = start if start is not None else plot_df['Datum des Eintrags'].min()
+    bis = ende if ende is not None else plot_df['Datum des Eintrags'].max()
+    spanne = (bis - von).days + 1
+    for freq, tage, name in VERDICHTUNG_STUFEN:
+        if spanne / tage <= budget: break
+    periode = plot_df['Datum des Eintrags'].dt.to_period(freq).dt.start_time
+    agg = plot_df.groupby(['Stockname', periode], observed=True)[y_spalte].agg(['mean', 'min', 'max']).reset_index()
+    agg = agg.rename(columns={'mean': y_spalte})
+    agg['Fehler_oben'] = agg['max'] - agg[y_spalte]
+    agg['Fehler_unten'] = agg[y_spalte] - agg['min']
+    return agg.drop(columns=['min', 'max']).sort_values(['Datum des Eintrags', 'Stockname']), f"{name} (Min/Max als Fehlerbalken)"
+
+# --- HINTERGRUND-STREIFEN (eine einzige Form statt einer pro Monat/Datum) ---
+STREIFEN_FARBE = "rgba(255,255,255,0.05)"
+
+def zeichne_streifen(fig, links, rechts):
+    """Alle Streifen als ein SVG-Pfad: ein Layout-Objekt, egal wie viele Streifen."""
+    pfad = " ".join(f"M{x0},0L{x1},0L{x1},1L{x0},1Z" for x0, x1 in zip(links, rechts))
+    if pfad:
+        fig.add_shape(type="path", path=pfad, xref="x", yref="paper",
+                      fillcolor=STREIFEN_FARBE, line_width=0, layer="below")
+
+
+def alarme(plot_df, y_spalte):
+    """Völker, deren letzter Wert im Ausschnitt über der Schwelle der Spalte liegt: [(volk, wert)]."""
+    if y_spalte not in ALARM_SCHWELLEN or plot_df.empty:
+        return []
+    schwelle, _ = ALARM_SCHWELLEN[y_spalte]
+    letzte = plot_df.groupby('Stockname', observed=True)[y_spalte].last()
+    return [(volk, wert) for volk, wert in letzte.items() if wert > schwelle]
+
+def ansicht_zeilen(daten, voelker, zeit, start_date, filter_ende):
+    # Nur die Blöcke der gewählten Völker im Zeitfenster – kein Filtern der ganzen Tabelle
+    if zeit.isdigit():
+        return daten.volk_index.saison(voelker, int(zeit))
+    return daten.volk_index.auswahl(voelker, start_date, filter_ende)
+
+def baue_diagramm(daten, ansicht, heute):
+    """Baut Figur und Hinweistexte für eine Ansicht. Reine Funktion der Eingaben -> cachebar."""
+    px = plotly_express()
+    aktuelle_voelker = ansicht['voelker']
+    color_map, emoji_map = daten.register.farben, daten.register.emojis
+    meldungen = []
+    fig = None
+    groesse = 0
+
+    start_date, end_date, filter_ende = zeitfenster(ansicht['zeit'], heute)
+    plot_df = ansicht_zeilen(daten, aktuelle_voelker, ansicht['zeit'], start_date, filter_ende)
+
+    metrik = ansicht['metrik']
+    y_spalte = METRIKEN.get(metrik, "Gewicht")
+
+    # --- DATENAUFBEREITUNG ---
+    # Leere Werte füllen, solange die Daten noch je Volk nach Datum sortiert sind (0 kg Gewicht gibt es nicht)
+    politik = LUECKEN_POLITIK.get(ansicht.get('luecken'))
+    if politik == "null" and metrik == "Gewicht": politik = None
+    if politik and y_spalte in plot_df.columns and not plot_df.empty:
+        leer = int(plot_df[y_spalte].isna().sum())
+        plot_df = fuelle_luecken(plot_df, y_spalte, politik)
+        gefuellt = leer - int(plot_df[y_spalte].isna().sum())
+        if gefuellt and politik != "null":
+            meldungen.append(("caption", f"🩹 {gefuellt} leere Werte ergänzt ({ansicht['luecken']}, nie über erkannte Lücken hinweg)"))
+    plot_df = plot_df.sort_values("Datum des Eintrags", kind='stable')
+
+    if y_spalte in plot_df.columns:
+        # float32 aus dem kompakten Speicher -> für Achse und Hover sauber runden
+        plot_df[y_spalte] = plot_df[y_spalte].astype('float64').round(3)
+        plot_df = plot_df.dropna(subset=[y_spalte])
+
+    if not plot_df.empty and y_spalte in plot_df.columns:
+        vorhandene_im_plot = plot_df['Stockname'].unique()
+        fehlende = [v for v in aktuelle_voelker if v not in vorhandene_im_plot]
+        if fehlende:
+            fehlende_labels = [f"**{emoji_map[v]} {v}**" for v in fehlende]
+            meldungen.append(("warning", f"⚠️ Keine Daten für {metrik} im gewählten Zeitraum: {', '.join(fehlende_labels)}"))
+        ueber = alarme(plot_df, y_spalte)
+        if ueber:
+            ueber_labels = [f"**{emoji_map[v]} {v}** ({w:.1f})" for v, w in ueber]
+            meldungen.append(("error", f"🚨 {ALARM_SCHWELLEN[y_spalte][1]}: {', '.join(ueber_labels)}"))
+
+    if not plot_df.empty and y_spalte in plot_df.columns:
+        if start_date:
+            info_text = f"📅 Filter-Zeitraum: {start_date.strftime('%d.%m.%Y')} bis {end_date.strftime('%d.%m.%Y')}"
+        else:
+            info_text = "📅 Filter-Zeitraum: Alle verfügbaren Daten"
+        meldungen.append(("caption", info_text))
+
+        # PODEST-TRICK (Volksstärke)
+        if metrik == "Volksstärke":
+            plot_df[y_spalte] = plot_df[y_spalte] + 1
+
+        # 🟢 REIHENFOLGE DER VÖLKER (HARD SORT)
+        plot_df['Stockname'] = plot_df['Stockname'].cat.remove_unused_categories()
+        sortierte_voelker = list(plot_df['Stockname'].cat.categories)  # Register-Reihenfolge
+        plot_df = plot_df.sort_values(by=['Datum des Eintrags', 'Stockname'])
+
+        # Lange Pausen nicht mit einer Linie überbrücken: Lücken an den echten Einträgen erkennen (vor der Verdichtung)
+        trenner = plot_df.iloc[:0]
+        if ansicht['chart'] == "Liniendiagramm" and not ansicht['stauchung']:
+            je_volk = plot_df.sort_values(['Stockname', 'Datum des Eintrags'], kind='stable')
+            trenner = trennstellen(je_volk, erkenne_luecken(je_volk))
+
+        # 📉 VERDICHTUNG (begrenzt die Datenmenge, die an den Browser geht)
+        fehlerbalken = {}
+        if not ansicht['rohdaten']:
+            anzahl_roh = len(plot_df)
+            budget = punkte_budget(len(sortierte_voelker))
+            plot_df, verdichtung = verdichte(plot_df, y_spalte, ansicht['chart'], budget, start_date, end_date if start_date else None)
+            if verdichtung:
+                meldungen.append(("caption", f"📉 {anzahl_roh} Einträge → {len(plot_df)} Punkte: {verdichtung}"))
+                if 'Fehler_oben' in plot_df.columns:
+                    fehlerbalken = dict(error_y='Fehler_oben', error_y_minus='Fehler_unten')
+
+        # --- PLOT ---
+        if not ansicht['stauchung']:
+            # 🔵 MODUS NORMAL
+            if ansicht['chart'] == "Liniendiagramm":
+                if len(trenner):
+                    plot_df = unterbrich_an_luecken(plot_df, y_spalte, trenner)
+                    meldungen.append(("caption", f"⛓️ {len(trenner)} Lücken – Linie dort unterbrochen"))
+                fig = px.line(plot_df, x='Datum des Eintrags', y=y_spalte, color='Stockname', 
+                              color_discrete_map=color_map, template="plotly_dark", markers=True,
+                              category_orders={'Stockname': sortierte_voelker})
+                fig.update_traces(line=dict(width=3), marker=dict(size=8, line=dict(width=1, color='white')))
+            else:
+                fig = px.bar(plot_df, x='Datum des Eintrags', y=y_spalte, color='Stockname', 
+                             color_discrete_map=color_map, barmode='group', template="plotly_dark",
+                             category_orders={'Stockname': sortierte_voelker}, **fehlerbalken)
+                fig.update_layout(bargap=0.1, bargroupgap=0.05)
+
+            x_axis_config = dict(
+                title=None, showgrid=False, zeroline=False,
+                ticklabelmode="period", dtick="M1", tickformat="%b %y"
+            )
+            if start_date: x_axis_config['range'] = [start_date, end_date]
+
+            x_min = start_date if start_date else plot_df['Datum des Eintrags'].min()
+            x_max = end_date if start_date else plot_df['Datum des Eintrags'].max()
+            monats_raster = pd.date_range(start=x_min - pd.Timedelta(days=32), end=x_max + pd.Timedelta(days=32), freq='MS')
+            gerade = monats_raster[:-1].month % 2 == 0
+            # Datumsangaben im Pfad: ohne Leerzeichen, daher nur JJJJ-MM-TT
+            zeichne_streifen(fig, monats_raster[:-1][gerade].strftime('%Y-%m-%d'), monats_raster[1:][gerade].strftime('%Y-%m-%d'))
+
+        else:
+            # 🔴 MODUS GESTAUCHT: jedes Datum bekommt eine ganze Zahl als Position, beschriftet werden nur wenige
+            position, anzahl_tage, ticks, texte = stauchungs_achse(plot_df['Datum des Eintrags'])
+            plot_df['Position'] = position
+            hover = {'Datum des Eintrags': '|%d.%m.%y', 'Position': False}
+
+            if ansicht['chart'] == "Liniendiagramm":
+                fig = px.line(plot_df, x='Position', y=y_spalte, color='Stockname', 
+                              color_discrete_map=color_map, template="plotly_dark", markers=True,
+                              category_orders={'Stockname': sortierte_voelker}, hover_data=hover)
+                fig.update_traces(line=dict(width=3), marker=dict(size=8, line=dict(width=1, color='white')))
+            else:
+                fig = px.bar(plot_df, x='Position', y=y_spalte, color='Stockname', 
+                             color_discrete_map=color_map, barmode='group', template="plotly_dark",
+                             category_orders={'Stockname': sortierte_voelker}, hover_data=hover, **fehlerbalken)
+                fig.update_layout(bargap=0.1, bargroupgap=0.05)
+
+            x_axis_config = dict(
+                title=None, showgrid=False, zeroline=False,
+                tickmode='array', tickvals=ticks, ticktext=texte, range=[-0.5, anzahl_tage - 0.5]
+            )
+
+            positionen = np.arange(0, anzahl_tage, 2)
+            zeichne_streifen(fig, positionen - 0.5, positionen + 0.5)
+
+        # ACHSE MIT TEXT (ANGEPASSTE WERTE)
+        y_axis_config = dict(title=metrik, gridcolor="rgba(255,255,255,0.1)")
+
+        if metrik == "Volksstärke":
+            y_axis_config.update(dict(
+                tickmode='array',
+                tickvals=[1, 2, 3], 
+                ticktext=['Schwach', 'Normal', 'Stark'],
+                range=[0.5, 3.1]
+            ))
+
+        if y_spalte in ALARM_SCHWELLEN:
+            fig.add_hline(y=ALARM_SCHWELLEN[y_spalte][0], line=dict(color="#E6194B", width=1, dash="dash"))
+
+        fig.update_layout(
+            xaxis=x_axis_config,
+            yaxis=y_axis_config,
+            plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, title=None)
+        )
+        groesse = int(plot_df.memory_usage(deep=True).sum())
+    else:
+        if y_spalte not in plot_df.columns:
+            meldungen.append(("error", f"⚠️ Spalte '{y_spalte}' nicht gefunden. Bitte CSV prüfen."))
+        else:
+            meldungen.append(("info", f"💡 Keine Daten für **'{metrik}'** im gewählten Zeitraum."))
+
+    return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse}
+
+# Metrik -> Spalte der Standort-Tageswerte
+STANDORT_METRIKEN = {"Gewicht": "Gewicht_mittel", "Zunahme/Abnahme": "Gewicht_Diff", "Varroa (Milben/Tag)": "Milben",
+                     "Volksstärke": "Bewertung Volksstärke", "Varroa Ø 7 Tage": "Varroa_7T",
+                     "Gewicht seit Saisonbeginn": "Gewicht_Saison"}
+
+def baue_standort_diagramm(daten, ansicht, heute):
+    """Übersicht: eine Linie/Balkengruppe pro Standort aus den vorberechneten Tageswerten.
+    Gewicht mit Spanne (min–max) als Fehlerbalken, Varroa als Summe aller Völker."""
+    px = plotly_express()
+    meldungen = []
+    fig = None
+    groesse = 0
+    metrik = ansicht['metrik']
+    y_spalte = STANDORT_METRIKEN.get(metrik, "Gewicht_mittel")
+    start_date, end_date, filter_ende = zeitfenster(ansicht['zeit'], heute)
+    plot_df = daten.standorte.ausschnitt(start_date, filter_ende)
+
+    if y_spalte in plot_df.columns:
+        plot_df = plot_df.dropna(subset=[y_spalte]).copy()
+        zahlen = plot_df.select_dtypes('floating').columns
+        plot_df[zahlen] = plot_df[zahlen].astype('float64').round(3)
+
+    if plot_df.empty or y_spalte not in plot_df.columns:
+        meldungen.append(("info", f"💡 Keine Daten für **'{metrik}'** im gewählten Zeitraum."))
+        return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse}
+
+    standorte = sorted(plot_df['Standort'].unique(), key=natural_sort_key)
+    color_map, _ = farb_zuordnung(standorte)
+    meldungen.append(("caption", f"🗺️ {len(standorte)} Standorte, Tageswerte über alle Völker des Standorts"))
+
+    extra = {}
+    if y_spalte == "Gewicht_mittel":
+        plot_df['Fehler_oben'] = plot_df['Gewicht_max'] - plot_df[y_spalte]
+        plot_df['Fehler_unten'] = plot_df[y_spalte] - plot_df['Gewicht_min']
+        extra = dict(error_y='Fehler_oben', error_y_minus='Fehler_unten')
+    hover = ['Voelker'] + [c for c in plot_df.columns if c.startswith("Staerke_") or c == "Gewicht_median"]
+
+    if ansicht['chart'] == "Liniendiagramm":
+        fig = px.line(plot_df, x='Datum des Eintrags', y=y_spalte, color='Standort', color_discrete_map=color_map,
+                      template="plotly_dark", markers=True, hover_data=hover, labels={'Voelker': 'Völker'},
+                      category_orders={'Standort': standorte}, **extra)
+        fig.update_traces(line=dict(width=3))
+    else:
+        fig = px.bar(plot_df, x='Datum des Eintrags', y=y_spalte, color='Standort', color_discrete_map=color_map,
+                     barmode='group', template="plotly_dark", hover_data=hover, labels={'Voelker': 'Völker'},
+                     category_orders={'Standort': standorte}, **extra)
+
+    x_axis_config = dict(title=None, showgrid=False, zeroline=False, dtick="M1", tickformat="%b %y")
+    if start_date: x_axis_config['range'] = [start_date, end_date]
+    y_axis_config = dict(title=metrik, gridcolor="rgba(255,255,255,0.1)")
+    if metrik == "Volksstärke":
+        # Mittelwert der Bewertungen 0..2, Verteilung steht im Hover
+        y_axis_config.update(tickmode='array', tickvals=list(STAERKE_KLASSEN), ticktext=list(STAERKE_KLASSEN.values()))
+    if y_spalte in ALARM_SCHWELLEN:
+        fig.add_hline(y=ALARM_SCHWELLEN[y_spalte][0], line=dict(color="#E6194B", width=1, dash="dash"))
+    fig.update_layout(
+        xaxis=x_axis_config,
+        yaxis=y_axis_config,
+        plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, title=None)
+    )
+    groesse = int(plot_df.memory_usage(deep=True).sum())
+    return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse}
+
+# --- VERGLEICH (alle Völker auf einem gemeinsamen Raster, Matrizen in einem Durchgang) ---
+VERGLEICH_RASTER_TAGE = 7   # Einträge je Volk und Woche gemittelt -> gemeinsame Zeitpunkte trotz verschiedener Stocktage
+VERGLEICH_MIN_PAARE = 4     # weniger gemeinsame Wochen: keine Korrelation
+VERGLEICH_ZAHLEN_BIS = 20   # bis zu so vielen Völkern stehen die Werte in der Heatmap
+
+def vergleichs_matrizen(plot_df, spalten, raster_tage=VERGLEICH_RASTER_TAGE):
+    """(matrizen, voelker, raster): je Spalte eine Matrix Zeitpunkt x Volk, NaN wo ein Volk keinen Wert hat.
+    Alle Spalten teilen Raster und Völker-Reihenfolge."""
+    voelker = list(plot_df['Stockname'].cat.remove_unused_categories().cat.categories)
+    if plot_df.empty:
+        return {c: np.empty((0, 0)) for c in spalten}, voelker, np.array([], dtype='datetime64[D]')
+    datum = plot_df['Datum des Eintrags'].to_numpy().astype('datetime64[D]')
+    schritt = np.timedelta64(raster_tage, 'D')
+    zeile = ((datum - datum.min()) // schritt).astype('int64')
+    spalte = pd.Categorical(plot_df['Stockname'], categories=voelker).codes
+    form = (int(zeile.max()) + 1, len(voelker))
+
+    matrizen = {}
+    for c in spalten:
+        if c not in plot_df.columns: continue
+        werte = plot_df[c].to_numpy(dtype='float64')
+        da = ~np.isnan(werte)
+        summe, anzahl = np.zeros(form), np.zeros(form)
+        np.add.at(summe, (zeile[da], spalte[da]), werte[da])
+        np.add.at(anzahl, (zeile[da], spalte[da]), 1)
+        with np.errstate(invalid='ignore'):
+            matrizen[c] = summe / anzahl  # 0/0 -> NaN
+    return matrizen, voelker, datum.min() + np.arange(form[0]) * schritt
+
+def korrelations_matrix(matrix, min_paare=VERGLEICH_MIN_PAARE):
+    """(r, n): Pearson-Korrelation aller Spaltenpaare über die jeweils gemeinsamen Zeilen.
+    Fünf Matrixprodukte statt einer Schleife über alle Paare."""
+    da = ~np.isnan(matrix)
+    x = np.where(da, matrix, 0.0)
+    m = da.astype('float64')
+    n = m.T @ m                 # gemeinsame Zeitpunkte
+    sx = x.T @ m                # sx[i, j]: Summe von i dort, wo auch j einen Wert hat
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kov = sxy - sx * sx.T / n
+        var = sxx - sx ** 2 / n
+        r = kov / np.sqrt(var * var.T)
+    r[n < min_paare] = np.nan
+    return np.clip(r, -1, 1), n
+
+def spalten_korrelation(a, b, min_paare=VERGLEICH_MIN_PAARE):
+    """Korrelation je Spalte zwischen zwei gleich geformten Matrizen (z.B. Varroa gegen Stärke je Volk)."""
+    da = ~np.isnan(a) & ~np.isnan(b)
+    n = da.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a = np.where(da, a - np.nansum(np.where(da, a, 0), axis=0) / n, 0.0)
+        b = np.where(da, b - np.nansum(np.where(da, b, 0), axis=0) / n, 0.0)
+        r = (a * b).sum(axis=0) / np.sqrt((a * a).sum(axis=0) * (b * b).sum(axis=0))
+    return np.where(n >= min_paare, np.clip(r, -1, 1), np.nan)
+
+def rangliste(matrizen, voelker, y_spalte, metrik):
+    """Eine Zeile pro Volk: Abstand zum Median aller Völker, Rang je Zeitpunkt und Varroa gegen Stärke."""
+    matrix = matrizen[y_spalte]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Zeitpunkte/Völker ganz ohne Wert -> NaN
+        median = np.nanmedian(matrix, axis=1, keepdims=True)
+        abstand = matrix - median
+        tabelle = pd.DataFrame({
+            'Stockname': voelker,
+            'Zeitpunkte': (~np.isnan(matrix)).sum(axis=0),
+            f'Ø {metrik}': np.nanmean(matrix, axis=0),
+            'Ø Abstand zum Median': np.nanmean(abstand, axis=0),
+            'Unter Median %': 100 * (abstand < 0).sum(axis=0) / np.maximum((~np.isnan(abstand)).sum(axis=0), 1),
+            # Perzentil je Zeitpunkt: 100 = höchster Wert aller Völker an diesem Zeitpunkt
+            'Ø Rang %': 100 * np.nanmean(pd.DataFrame(matrix).rank(axis=1, pct=True).to_numpy(), axis=0),
+        })
+        if 'Milben' in matrizen and 'Bewertung Volksstärke' in matrizen:
+            for spalte, name in [('Milben', 'Ø Varroa'), ('Bewertung Volksstärke', 'Ø Volksstärke')]:
+                if spalte != y_spalte: tabelle[name] = np.nanmean(matrizen[spalte], axis=0)
+            tabelle['r Varroa/Stärke'] = spalten_korrelation(matrizen['Milben'], matrizen['Bewertung Volksstärke'])
+    tabelle = tabelle.sort_values('Ø Abstand zum Median', ascending=False, kind='stable', na_position='last')
+    zahlen = tabelle.select_dtypes('floating').columns
+    tabelle[zahlen] = tabelle[zahlen].round(2)
+    return tabelle.reset_index(drop=True)
+
+def baue_vergleich(daten, ansicht, heute):
+    """Vergleichsmodus: Korrelation der gewählten Metrik zwischen allen gewählten Völkern als Heatmap,
+    dazu eine Rangliste (Tabelle). Wie baue_diagramm eine reine Funktion der Eingaben."""
+    px = plotly_express()
+    meldungen = []
+    fig, tabelle, groesse = None, None, 0
+    metrik = ansicht['metrik']
+    y_spalte = METRIKEN.get(metrik, "Gewicht")
+    start_date, _, filter_ende = zeitfenster(ansicht['zeit'], heute)
+    plot_df = ansicht_zeilen(daten, daten.register.sortiert(ansicht['voelker']), ansicht['zeit'], start_date, filter_ende)
+    if y_spalte not in plot_df.columns:
+        meldungen.append(("error", f"⚠️ Spalte '{y_spalte}' nicht gefunden. Bitte CSV prüfen."))
+        return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse, 'tabelle': tabelle}
+
+    matrizen, voelker, raster = vergleichs_matrizen(plot_df, [y_spalte, "Milben", "Bewertung Volksstärke"])
+    # Nur Völker mit Werten der gewählten Metrik; Varroa/Stärke zählen auch an Tagen ohne diese Metrik
+    if len(voelker):
+        mit_werten = ~np.isnan(matrizen[y_spalte]).all(axis=0)
+        matrizen = {c: m[:, mit_werten] for c, m in matrizen.items()}
+        voelker = [v for v, da in zip(voelker, mit_werten) if da]
+    if len(voelker) < 2:
+        meldungen.append(("info", f"💡 Für den Vergleich mindestens zwei Völker mit **'{metrik}'** im Zeitraum wählen."))
+        return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse, 'tabelle': tabelle}
+
+    r, n = korrelations_matrix(matrizen[y_spalte])
+    meldungen.append(("caption", f"🔗 {len(voelker)} Völker auf {len(raster)} Wochen ab {pd.Timestamp(raster[0]).strftime('%d.%m.%Y')} – "
+                                 f"Korrelation nur bei mindestens {VERGLEICH_MIN_PAARE} gemeinsamen Wochen"))
+    fig = px.imshow(r, x=voelker, y=voelker, zmin=-1, zmax=1, color_continuous_scale="RdBu", aspect="auto",
+                    template="plotly_dark", text_auto=".2f" if len(voelker) <= VERGLEICH_ZAHLEN_BIS else False,
+                    labels=dict(color="r"))
+    fig.update_traces(customdata=n, hovertemplate="%{y} / %{x}<br>r = %{z:.2f}<br>%{customdata:.0f} gemeinsame Wochen<extra></extra>")
+    fig.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+                      xaxis=dict(title=None), yaxis=dict(title=None))
+
+    tabelle = rangliste(matrizen, voelker, y_spalte, metrik)
+    meldungen.append(("caption", "🏁 Rangliste: oben liegen die Völker am weitesten über dem Median aller gewählten Völker"))
+    groesse = int(r.nbytes + n.nbytes + tabelle.memory_usage(deep=True).sum())
+    return {'fig': fig, 'meldungen': meldungen, 'groesse': groesse, 'tabelle': tabelle}
+
+# --- EXPORT ---
+EXPORT_BLOCK_ZEILEN = 20_000
+
+# Nur intern: Kennung für den Abgleich und Verlaufswerte aus dem Index (stehen nicht in der KIM-Datei)
+INTERNE_SPALTEN = ["Eintrag_ID", "Gewicht_Diff", "Gewicht_Saison", "Varroa_7T"]
+
+def export_tabelle(df):
+    return df.drop(columns=INTERNE_SPALTEN, errors='ignore')
+
+def export_csv(df):
+    # Blockweise kodieren: nie die ganze Tabelle als einen großen String im Speicher
+    df = export_tabelle(df)
+    puffer = io.BytesIO()
+    for i in range(0, max(len(df), 1), EXPORT_BLOCK_ZEILEN):
+        teil = df.iloc[i:i + EXPORT_BLOCK_ZEILEN].to_csv(index=False, header=(i == 0), sep=';')
+        puffer.write(teil.encode('latin-1', errors='replace'))
+    return puffer.getvalue()
+
+def export_xlsx(df):
+    puffer = io.BytesIO()
+    with pd.ExcelWriter(puffer, engine='openpyxl') as writer:
+        export_tabelle(df).to_excel(writer, index=False, sheet_name="KIM-Daten")
+    return puffer.getvalue()
+
+# --- BERICHT ---
+def zusammenfassung(daten):
+    """Eine Zeile pro Volk: Zeitraum, Gewicht, Zunahme, Varroa und letzte Volksstärke."""
+    df = daten.volk_index.daten
+    gruppen = df.groupby('Stockname', observed=True, sort=False)
+    tabelle = pd.DataFrame({
+        'Standortname': gruppen['Standortname'].first() if 'Standortname' in df.columns else None,
+        'Erster Eintrag': gruppen['Datum des Eintrags'].min(),
+        'Letzter Eintrag': gruppen['Datum des Eintrags'].max(),
+        'Einträge': gruppen.size(),
+    })
+    if 'Gewicht' in df.columns:
+        tabelle['Gewicht zuletzt'] = gruppen['Gewicht'].last()
+        tabelle['Gewicht min'] = gruppen['Gewicht'].min()
+        tabelle['Gewicht max'] = gruppen['Gewicht'].max()
+        tabelle['Zunahme gesamt'] = gruppen['Gewicht_Diff'].sum(min_count=1)
+        tabelle['Zunahme Saison'] = gruppen['Gewicht_Saison'].last()
+    if 'Milben' in df.columns:
+        tabelle['Milben/Tag Ø'] = gruppen['Milben'].mean()
+        tabelle['Milben/Tag max'] = gruppen['Milben'].max()
+    if 'Varroa_7T' in df.columns:
+        tabelle['Varroa Ø 7 Tage zuletzt'] = gruppen['Varroa_7T'].last()
+    if 'Bewertung Volksstärke' in df.columns:
+        tabelle['Volksstärke zuletzt'] = gruppen['Bewertung Volksstärke'].last()
+    tabelle = tabelle.reindex(daten.register.sortiert(tabelle.index))
+    tabelle.index.name = 'Stockname'
+    zahlen = tabelle.select_dtypes('floating').columns
+    tabelle[zahlen] = tabelle[zahlen].astype('float64').round(3)
+    return tabelle.reset_index()
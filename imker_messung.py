@@ -0,0 +1,70 @@
+"""Messung für das Dashboard: Laufzeit, Zeilen und Speicher pro Abschnitt.
+
+Nur Standardbibliothek, damit das Dashboard schon vor dem Laden von pandas,
+Plotly und imker_kern messen (und das Upload-Feld anzeigen) kann.
+"""
+import os
+import json
+import time
+import logging
+import logging.handlers
+from contextlib import contextmanager
+
+# --- MESSUNG (optional: Laufzeit, Zeilen und Speicher pro Abschnitt) ---
+MESS_LOG_MAX_BYTES = 1024 * 1024
+MESS_LOG_ANZAHL = 3
+
+def mess_logger(pfad):
+    """Logger, der in eine rollierende Datei schreibt (max. MESS_LOG_ANZAHL alte Dateien)."""
+    logger = logging.getLogger(f"imker.messung.{os.path.abspath(pfad)}")
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(pfad, maxBytes=MESS_LOG_MAX_BYTES,
+                                                       backupCount=MESS_LOG_ANZAHL, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+class Messprotokoll:
+    """Sammelt pro Abschnitt Laufzeit (ms) und optional Zeilen/Speicher eines DataFrames.
+
+    Ausgeschaltet kostet ein Abschnitt praktisch nichts. `eintraege` darf von außen
+    kommen (z.B. aus der Sitzung), damit Teil-Durchläufe die übrigen Werte behalten.
+    """
+    def __init__(self, aktiv=False, eintraege=None, logger=None):
+        self.aktiv = aktiv
+        self.eintraege = {} if eintraege is None else eintraege
+        self.logger = logger
+
+    def _ablegen(self, name, eintrag):
+        self.eintraege[name] = eintrag
+        if self.logger:
+            self.logger.info(json.dumps({'abschnitt': name, **eintrag}, ensure_ascii=False, default=str))
+
+    @contextmanager
+    def abschnitt(self, name):
+        # Im Block darf eintrag['df'] gesetzt werden, dazu beliebige eigene Felder
+        eintrag = {}
+        if not self.aktiv:
+            yield eintrag
+            return
+        start = time.perf_counter()
+        try:
+            yield eintrag
+        finally:
+            eintrag['ms'] = round((time.perf_counter() - start) * 1000, 1)
+            df = eintrag.pop('df', None)
+            if df is not None:
+                eintrag['zeilen'] = len(df)
+                eintrag['speicher_mb'] = round(df.memory_usage(deep=True).sum() / 2**20, 2)
+            self._ablegen(name, eintrag)
+
+    def marke(self, name, seit, **felder):
+        """Zeit von `seit` (perf_counter) bis jetzt, z.B. Start des Durchlaufs bis sichtbares Upload-Feld."""
+        if self.aktiv:
+            self._ablegen(name, {'ms': round((time.perf_counter() - seit) * 1000, 1), **felder})
+
+    def tabelle(self):
+        import pandas as pd  # erst für die Anzeige; das Messen selbst braucht kein pandas
+        return pd.DataFrame([{'Abschnitt': name, **self.eintraege[name]} for name in sorted(self.eintraege)])
@@ -0,0 +1,95 @@
+"""Berichte ohne Oberfläche: KIM-Exporte auswerten und Tabellen/Diagramme ablegen.
+
+Jede Datei wird in einem eigenen Prozess verarbeitet und bekommt einen Ordner
+unter --ziel mit einer Zusammenfassung pro Volk und einem Diagramm pro Metrik.
+
+Beispiel (z.B. nächtlich per cron):
+    python imker_report.py daten.csv ALT.csv --ziel berichte --jobs 4
+
+Mit --zusammen werden alle Dateien zu einem Bericht zusammengeführt
+(doppelte Einträge aus überlappenden Exporten zählen nur einmal).
+"""
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from imker_kern import (
+    METRIKEN, Datensatz, lade_csv, fuehre_zusammen,
+    baue_diagramm, zusammenfassung,
+)
+
+try:
+    import kaleido  # noqa: F401  (nur für PNG/SVG-Diagramme nötig)
+    HAT_KALEIDO = True
+except ImportError:
+    HAT_KALEIDO = False
+
+def dateiname(text):
+    return re.sub(r'\W+', '_', text).strip('_').lower()
+
+def speichere_figur(fig, pfad, fmt):
+    # Ohne kaleido keine statischen Bilder -> eigenständige HTML-Datei
+    if fmt == "html" or not HAT_KALEIDO:
+        fig.write_html(pfad + ".html", include_plotlyjs="cdn")
+        return pfad + ".html"
+    fig.write_image(pfad + "." + fmt, width=1400, height=600)
+    return pfad + "." + fmt
+
+def bericht(pfad, ziel, fmt):
+    """Verarbeitet eine CSV-Datei (oder eine Liste, die zusammengeführt wird).
+    Läuft im Arbeitsprozess; liefert (pfad, zeilen, völker, dateien)."""
+    if isinstance(pfad, list):
+        daten = Datensatz(fuehre_zusammen(pfad).df, "zusammen")
+        ordner = os.path.join(ziel, "zusammen")
+        pfad = " + ".join(pfad)
+    else:
+        daten = Datensatz(lade_csv(pfad), pfad)
+        ordner = os.path.join(ziel, dateiname(os.path.splitext(os.path.basename(pfad))[0]))
+    os.makedirs(ordner, exist_ok=True)
+
+    tabelle = zusammenfassung(daten)
+    tabelle.to_csv(os.path.join(ordner, "zusammenfassung.csv"), index=False, sep=';', encoding='latin-1', errors='replace')
+    dateien = [os.path.join(ordner, "zusammenfassung.csv")]
+
+    voelker = daten.register.namen
+    heute = pd.Timestamp.now().normalize()
+    for metrik in METRIKEN:
+        ansicht = {"voelker": voelker, "metrik": metrik, "zeit": "Alles anzeigen", "chart": "Liniendiagramm",
+                   "stauchung": False, "luecken": "Auslassen", "rohdaten": False}
+        ergebnis = baue_diagramm(daten, ansicht, heute)
+        if ergebnis['fig'] is not None:
+            dateien.append(speichere_figur(ergebnis['fig'], os.path.join(ordner, dateiname(metrik)), fmt))
+    return pfad, len(daten.df), len(tabelle), dateien
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KIM-Exporte ohne Dashboard auswerten.")
+    parser.add_argument("dateien", nargs="+", help="eine oder mehrere KIM-CSV-Dateien")
+    parser.add_argument("--ziel", default="berichte", help="Ausgabeordner (Standard: berichte)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Anzahl paralleler Prozesse")
+    parser.add_argument("--format", choices=["png", "svg", "html"], default="png", help="Diagrammformat")
+    parser.add_argument("--zusammen", action="store_true", help="alle Dateien zu einem Bericht zusammenführen")
+    args = parser.parse_args(argv)
+
+    if args.format != "html" and not HAT_KALEIDO:
+        print("⚠️ kaleido nicht installiert – Diagramme werden als HTML gespeichert.", file=sys.stderr)
+
+    fehler = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        arbeit = [args.dateien] if args.zusammen else args.dateien
+        auftraege = {pool.submit(bericht, pfad, args.ziel, args.format): pfad for pfad in arbeit}
+        for auftrag in as_completed(auftraege):
+            try:
+                pfad, zeilen, voelker, dateien = auftrag.result()
+            except Exception as e:
+                fehler += 1
+                print(f"❌ {auftraege[auftrag]}: {e}", file=sys.stderr)
+                continue
+            print(f"✅ {pfad}: {zeilen} Einträge, {voelker} Völker -> {len(dateien)} Dateien")
+    return 1 if fehler else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,30 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import os
-import re
+import io
+import sys
+import time
 from datetime import datetime
 
+# Nur Leichtes vorab; pandas und imker_kern werden erst nach dem Upload-Feld geladen (siehe 2.)
+from imker_messung import Messprotokoll, mess_logger
+
+START = time.perf_counter()
+KALTSTART = 'imker_kern' not in sys.modules  # erster Durchlauf im Prozess: Importe kosten noch Zeit
+
+# --- MESSUNG (nur mit IMKER_MESSUNG=1 oder ?messung=1 in der Adresse) ---
+MESSUNG_AKTIV = os.environ.get("IMKER_MESSUNG") == "1" or st.query_params.get("messung") == "1"
+MESS_LOG = "imker_messung.log"
+if MESSUNG_AKTIV: st.session_state.messung = {}  # voller Durchlauf: alles neu messen
+messung = Messprotokoll(MESSUNG_AKTIV, st.session_state.get('messung'), mess_logger(MESS_LOG) if MESSUNG_AKTIV else None)
+
 # 1. SETUP
-st.set_page_config(page_title="Imker-Analyse", layout="wide")
+with messung.abschnitt("1. Setup"):
+    st.set_page_config(page_title="Imker-Analyse", layout="wide")
 
-# CSS
-st.markdown("""
+    # CSS
+    st.markdown("""
 <style>
-div[data-testid="stDownloadButton"] button {
+div[data-testid="stPopover"] button {
     min-height: 64px !important;
     height: 64px !important;
     border-radius: 8px !important;
@@ -20,360 +33,389 @@ div[data-testid="stDownloadButton"] button {
 </style>
 """, unsafe_allow_html=True)
 
-# --- SPEICHER (State Management) ---
-if 'storage_voelker' not in st.session_state: st.session_state.storage_voelker = []
-if 'storage_chart' not in st.session_state: st.session_state.storage_chart = "Liniendiagramm" 
-if 'storage_zeit' not in st.session_state: st.session_state.storage_zeit = "Letzte 6 Monate"   
-if 'storage_metrik' not in st.session_state: st.session_state.storage_metrik = "Gewicht"        
-# Standards
-if 'storage_stauchung' not in st.session_state: st.session_state.storage_stauchung = True 
-if 'storage_zeros' not in st.session_state: st.session_state.storage_zeros = False         
-
-# 🟢 NEUE FARB-PALETTE (Maximaler Kontrast)
-FARB_POOL = [
-    ('#E6194B', '🔴'), # Signalrot
-    ('#3CB44B', '🟢'), # Sattes Grün
-    ('#FFE119', '🟡'), # Dunkelgelb / Gold
-    ('#4363D8', '🔵'), # Kräftiges Blau
-    ('#F58231', '🟠'), # Orange
-    ('#911EB4', '🟣'), # Lila / Violett
-    ('#42D4F4', '💧'), # Cyan / Türkis
-    ('#F032E6', '🌸'), # Magenta / Pink
-    ('#BFEF45', '🍏'), # Limettengrün
-    ('#A9A9A9', '🐘')  # Grau / Anthrazit
-]
+    # --- SPEICHER (State Management) ---
+    if 'storage_voelker' not in st.session_state: st.session_state.storage_voelker = []
+    if 'storage_chart' not in st.session_state: st.session_state.storage_chart = "Liniendiagramm" 
+    if 'storage_zeit' not in st.session_state: st.session_state.storage_zeit = "Letzte 6 Monate"   
+    if 'storage_metrik' not in st.session_state: st.session_state.storage_metrik = "Gewicht"        
+    # Standards
+    if 'storage_stauchung' not in st.session_state: st.session_state.storage_stauchung = True 
+    if 'storage_luecken' not in st.session_state: st.session_state.storage_luecken = "Auslassen"
+    if 'storage_rohdaten' not in st.session_state: st.session_state.storage_rohdaten = False
+    if 'storage_vergleich' not in st.session_state: st.session_state.storage_vergleich = False
+    if 'storage_standort' not in st.session_state: st.session_state.storage_standort = ""  # "" = noch nicht gewählt, None = Übersicht
+    if 'export_ansicht' not in st.session_state: st.session_state.export_ansicht = {}
 
 # Helper
 def save_chart_change(): st.session_state.storage_chart = st.session_state.widget_chart_key
 def save_zeit_change(): st.session_state.storage_zeit = st.session_state.widget_zeit_key
 def save_stauchung_change(): st.session_state.storage_stauchung = st.session_state.widget_stauchung_key
-def save_zeros_change(): st.session_state.storage_zeros = st.session_state.widget_zeros_key
-def natural_sort_key(s): return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', str(s))]
+def save_luecken_change(): st.session_state.storage_luecken = st.session_state.widget_luecken_key
+def save_rohdaten_change(): st.session_state.storage_rohdaten = st.session_state.widget_rohdaten_key
+def save_vergleich_change(): st.session_state.storage_vergleich = st.session_state.widget_vergleich_key
+# Button-Callbacks: Zustand ändern, bevor das Fragment neu zeichnet (kein st.rerun() nötig)
+def alle_auswaehlen(alle): st.session_state.storage_voelker = list(alle)
+def auswahl_leeren(): st.session_state.storage_voelker = []
+def metrik_setzen(label): st.session_state.storage_metrik = label
+def standort_waehlen(name, voelker=()):
+    st.session_state.storage_standort = name
+    # Beim Wechsel in einen Standort nur dessen Völker ausgewählt lassen
+    if name is not None: st.session_state.storage_voelker = [v for v in st.session_state.storage_voelker if v in voelker]
+def volk_umschalten(name):
+    if name in st.session_state.storage_voelker: st.session_state.storage_voelker.remove(name)
+    else: st.session_state.storage_voelker.append(name)
+
+# --- CACHE (Daten nur einmal einlesen) ---
+CACHE_MAX_DATEIEN = 8
+
+@st.cache_resource
+def daten_cache():
+    # Uploads, ein Cache für alle Sitzungen; die DataFrames darin werden nur gelesen, nie verändert
+    return LRUCache(CACHE_MAX_DATEIEN)
+
+@st.cache_resource
+def basis_daten(pfad):
+    # Basis-Datei: genau eine Fassung pro Prozess, unabhängig vom Upload-Cache (wird nie verdrängt)
+    return GeteilteBasisdaten(pfad)
+
+def lade_daten(quelle):
+    """Liefert (datensatz, aus_cache). Gleicher Inhalt wird nur beim ersten Mal eingelesen."""
+    if not hasattr(quelle, 'read'):
+        return basis_daten(os.path.abspath(quelle)).hole()
+    schluessel = quell_schluessel(quelle)
+    cache = daten_cache()
+    daten = cache.hole(schluessel)
+    if daten is not None:
+        return daten, True
+    daten = Datensatz(lade_csv(quelle), schluessel)
+    cache.lege_ab(schluessel, daten)
+    return daten, False
+
+def lade_zusammen(quellen):
+    """Wie lade_daten für mehrere Dateien. Kommt eine Datei hinzu, wird nur diese eingelesen."""
+    einzel = [quell_schluessel(q) for q in quellen]
+    schluessel = zusammen_schluessel(einzel)
+    cache = daten_cache()
+    daten = cache.hole(schluessel)
+    if daten is not None:
+        return daten, True
+    # Schlüssel-Index der bisherigen Dateien liegt in der Sitzung
+    zusammen = fuehre_zusammen(quellen, st.session_state.get('zusammenfuehrung'), einzel)
+    st.session_state.zusammenfuehrung = zusammen
+    daten = Datensatz(zusammen.df, schluessel)
+    cache.lege_ab(schluessel, daten)
+    return daten, False
+
+# --- DIAGRAMM (fertige Figuren werden pro Ansicht zwischengespeichert) ---
+ANSICHT_FELDER = ["standort", "voelker", "metrik", "zeit", "chart", "stauchung", "luecken", "rohdaten", "vergleich"]
+FIGUR_CACHE_MAX = 32
+FIGUR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource
+def figur_cache():
+    # Figuren werden nur gelesen (st.plotly_chart serialisiert, ohne sie zu verändern)
+    return LRUCache(FIGUR_CACHE_MAX, max_bytes=FIGUR_CACHE_MAX_BYTES)
+
+# --- EXPORT (erst beim Klick erzeugt, pro Datensatz zwischengespeichert) ---
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@st.cache_resource
+def export_cache():
+    return LRUCache(4)
+
+def erstelle_export(daten, fmt, voelker=None, zeit=None):
+    """Export-Datei als Bytes. voelker/zeit gesetzt = nur Auswahl und Zeitraum aus dem Dashboard."""
+    schluessel = (daten.schluessel, fmt, tuple(voelker) if voelker else None, zeit)
+    cache = export_cache()
+    inhalt = cache.hole(schluessel)
+    if inhalt is None:
+        if voelker:
+            start_date, _, filter_ende = zeitfenster(zeit, pd.Timestamp.now().normalize())
+            df = daten.volk_index.auswahl(voelker, start_date, filter_ende)
+        else:
+            df = daten.df
+        inhalt = export_xlsx(df) if fmt == "xlsx" else export_csv(df)
+        cache.lege_ab(schluessel, inhalt)
+    return inhalt
+
+def export_gemessen(daten, fmt, voelker=None, zeit=None):
+    # Läuft beim Klick außerhalb eines Durchlaufs -> landet nur in der Log-Datei
+    with messung.abschnitt("Export (Download)") as eintrag:
+        inhalt = erstelle_export(daten, fmt, voelker, zeit)
+        eintrag.update(format=fmt, bytes=len(inhalt))
+    return inhalt
+
+# --- LIVE (Basis-Datei beobachten) ---
+LIVE_INTERVALL_S = 5
+
+# --- BILDER (einmal pro Prozess gelesen) ---
+VOLK_LOGO_BREITE = 160
+
+@st.cache_resource
+def lade_bild(pfad, breite=None):
+    """Bilddatei als Bytes; mit `breite` einmalig verkleinert (spart Dekodieren und Übertragung)."""
+    if breite is None:
+        with open(pfad, 'rb') as f:
+            return f.read()
+    from PIL import Image
+    with Image.open(pfad) as bild:
+        bild.thumbnail((breite, breite * 10))
+        puffer = io.BytesIO()
+        bild.convert("RGB").save(puffer, format="JPEG", quality=85)
+    return puffer.getvalue()
 
 # --- 2. HEADER ---
-head_col1, head_col2 = st.columns([2, 1], vertical_alignment="bottom")
-download_placeholder = None
+with messung.abschnitt("2. Header & Upload") as eintrag:
+    head_col1, head_col2 = st.columns([2, 1], vertical_alignment="bottom")
+    download_placeholder = None
 
-with head_col1:
-    st.title("Meine Völker - Auswertung")
-    up_col, dl_col = st.columns([0.8, 0.2], vertical_alignment="bottom")
+    with head_col1:
+        st.title("Meine Völker - Auswertung")
+        up_col, dl_col = st.columns([0.8, 0.2], vertical_alignment="bottom")
     
-    with up_col:
-        uploaded_file = st.file_uploader("KIM-CSV Datei hochladen", type=["csv"])
+        with up_col:
+            uploaded_files = st.file_uploader("KIM-CSV Datei hochladen", type=["csv"], accept_multiple_files=True,
+                                              help="Mehrere Dateien werden zusammengeführt, doppelte Einträge nur einmal gezählt.")
     
-    with dl_col:
-        download_placeholder = st.empty()
+        with dl_col:
+            download_placeholder = st.empty()
+
+        # Titel und Upload-Feld stehen jetzt im Browser -> erst jetzt die Analyse laden
+        messung.marke("0. Start bis Upload-Feld", START, kaltstart=KALTSTART)
+        with messung.abschnitt("2a. Import Analyse") as import_eintrag:
+            import pandas as pd
+            from imker_kern import (
+                METRIKEN, LUECKEN_POLITIK, HAT_XLSX, LRUCache, Datensatz, zeitfenster, GeteilteBasisdaten,
+                quell_schluessel, zusammen_schluessel, fuehre_zusammen, lade_csv, snapshot_vorhanden, snapshot_schreibbar,
+                uebernimm_in_basisdaten, baue_diagramm, baue_standort_diagramm, baue_vergleich, export_csv, export_xlsx,
+            )
+            import_eintrag['kaltstart'] = KALTSTART
     
-    DEFAULT_FILE = "daten.csv"
-    file_to_load = None
+        DEFAULT_FILE = "daten.csv"
+        file_to_load = None
     
-    if uploaded_file:
-        file_to_load = uploaded_file
-        st.info(f"ℹ️ Datei: {uploaded_file.name}")
-    elif os.path.exists(DEFAULT_FILE):
-        file_to_load = DEFAULT_FILE
-        ts = os.path.getmtime(DEFAULT_FILE)
-        st.success(f"✅ Basis-Daten geladen")
-    else:
-        st.info("ℹ️ Bitte CSV hochladen.")
+        if uploaded_files:
+            file_to_load = uploaded_files[0] if len(uploaded_files) == 1 else uploaded_files
+            st.info(f"ℹ️ Datei: {', '.join(f.name for f in uploaded_files)}")
+        elif os.path.exists(DEFAULT_FILE) or snapshot_vorhanden(DEFAULT_FILE):
+            file_to_load = DEFAULT_FILE
+            st.success(f"✅ Basis-Daten geladen")
+            st.toggle("🔄 Live: neue Einträge automatisch übernehmen", key="live_modus",
+                      help=f"Prüft alle {LIVE_INTERVALL_S} Sekunden, ob {DEFAULT_FILE} gewachsen ist, und liest nur die neuen Zeilen.")
+        else:
+            st.info("ℹ️ Bitte CSV hochladen.")
+    
+        cache_placeholder = st.empty()
+        uebernahme_placeholder = st.empty()
 
-with head_col2:
-    st.image("BienenLogo.jpg", use_container_width=True)
+    with head_col2:
+        st.image(lade_bild("BienenLogo.jpg"), use_container_width=True)
+    if uploaded_files: eintrag['upload_bytes'] = sum(f.size for f in uploaded_files)
 
 # --- 3. LOGIK ---
-if file_to_load:
-    df = None
-    try:
-        if hasattr(file_to_load, 'seek'): file_to_load.seek(0)
-        
+with messung.abschnitt("3. Logik") as eintrag:
+    if file_to_load:
+        df = None
         try:
-            df = pd.read_csv(file_to_load, sep=',', encoding='latin-1')
-            if len(df.columns) < 2: raise Exception("Falscher Trenner")
-        except:
-            if hasattr(file_to_load, 'seek'): file_to_load.seek(0)
-            df = pd.read_csv(file_to_load, sep=';', encoding='latin-1')
-
-        df.columns = df.columns.str.strip()
+            if isinstance(file_to_load, list):
+                daten, aus_cache = lade_zusammen(file_to_load)
+            else:
+                daten, aus_cache = lade_daten(file_to_load)
+            df = daten.df
+            eintrag.update(df=df, cache="Treffer" if aus_cache else "neu eingelesen")
+            cache_placeholder.caption("⚡ Aus dem Zwischenspeicher" if aus_cache else "📄 Datei neu eingelesen")
         
+            # Nur anbieten, wenn der Snapshot geschrieben werden kann (sonst wird nur die CSV gelesen)
+            if uploaded_files and snapshot_schreibbar(DEFAULT_FILE):
+                if uebernahme_placeholder.button("📥 Neue Einträge in Basis-Daten übernehmen"):
+                    try:
+                        anzahl = uebernimm_in_basisdaten(DEFAULT_FILE, df)
+                        st.toast(f"✅ {anzahl} neue Einträge übernommen")
+                    except OSError as e:
+                        st.warning(f"⚠️ Basis-Daten konnten nicht gespeichert werden: {e}")
         
-        # 🟢 1. REINIGUNG & UMBENENNUNG
-        rename_map = {}
-        for col in df.columns:
-            # Varroa-Logik: Wir suchen die ZWEI Bestandteile
-            if "hlte" in col and "Milben" in col: 
-                rename_map[col] = "Milben_Count"
-            if "hlzeitraum"in col and "Tage" in col:
-                rename_map[col] = "Milben_Days"
-
-            # Volksstärke-Logik
-            if "Bewertung" in col and ("Volk" in col or "Stärke" in col): 
-                rename_map[col] = "Bewertung Volksstärke"
-                        
-        df = df.rename(columns=rename_map)
-        df = df.loc[:, ~df.columns.duplicated()]
-
-
-        # 🟢 2. VARROA BERECHNUNG (Milben / Tage)
-        if 'Milben_Count' in df.columns and 'Milben_Days' in df.columns:
-            # Zahlen sicherstellen
-            c = pd.to_numeric(df['Milben_Count'], errors='coerce')
-            # Bei Tagen: Wenn leer oder 0, nehmen wir 1 an (um 'Teilen durch 0' zu verhindern)
-            d = pd.to_numeric(df['Milben_Days'], errors='coerce').fillna(1)
-            d = d.replace(0, 1) 
-            
-            # HIER PASSIERT DIE MAGIE:
-            df['Milben'] = c / d
+            heute_str = datetime.now().strftime('%Y-%m-%d')
+            with download_placeholder.popover("💾 Für Excel Speichern", use_container_width=True):
+                export_formate = ["csv", "xlsx"] if HAT_XLSX else ["csv"]
+                export_fmt = st.radio("Format:", export_formate, horizontal=True, key="export_format")
+                nur_auswahl = st.checkbox("Nur gewählte Völker & Zeitraum", key="export_auswahl",
+                                          help="Ohne ausgewählte Völker wird alles exportiert.")
             
-        if 'Datum des Eintrags' not in df.columns:
-            st.error(f"❌ Spalte 'Datum des Eintrags' fehlt.")
-            st.stop()
-
-        df['Datum des Eintrags'] = pd.to_datetime(df['Datum des Eintrags'], dayfirst=True, errors='coerce')
-        df['Datum des Eintrags'] = df['Datum des Eintrags'].dt.normalize()
-        
-        df = df.dropna(subset=['Datum des Eintrags', 'Stockname'])
-        
-        csv_daten = df.to_csv(index=False, sep=';', encoding='latin-1', errors='replace')
-        heute_str = datetime.now().strftime('%Y-%m-%d')
-        export_name = f"KIM_Daten_{heute_str}.csv"
-
-        download_placeholder.download_button(
-            label="💾 Für Excel Speichern", 
-            data=csv_daten,
-            file_name=export_name,
-            mime="text/csv",
-            use_container_width=True,
-            type="secondary"
-        )
+                # Auswahl erst beim Klick lesen: das Völker-Fragment ändert sie ohne Neuladen dieses Teils
+                export_ansicht = st.session_state.export_ansicht
+                st.download_button(
+                    label="⬇️ Herunterladen", 
+                    data=lambda: export_gemessen(export_ansicht.get('daten', daten), export_fmt,
+                                                 export_ansicht.get('voelker') if nur_auswahl else None,
+                                                 export_ansicht.get('zeit') if nur_auswahl else None),
+                    file_name=f"KIM_Daten_{heute_str}.{export_fmt}",
+                    mime=XLSX_MIME if export_fmt == "xlsx" else "text/csv",
+                    on_click="ignore",
+                    use_container_width=True,
+                    type="secondary"
+                )
         
-    except Exception as e:
-        st.error(f"❌ Fehler: {e}")
+        except Exception as e:
+            st.error(f"❌ Fehler: {e}")
+            st.stop()
+    else:
         st.stop()
-else:
-    st.stop()
-
-# --- 4. VÖLKERAUSWAHL ---
-st.write("### Schnellzugriff Völker")
-alle_voelker = sorted(df['Stockname'].unique(), key=natural_sort_key)
-
-c_all, c_none, c_dummy = st.columns([0.2, 0.2, 0.6])
-with c_all:
-    if st.button("✅ Alle auswählen", use_container_width=True):
-        st.session_state.storage_voelker = list(alle_voelker)
-        st.rerun()
-with c_none:
-    if st.button("❌ Auswahl leeren", use_container_width=True):
-        st.session_state.storage_voelker = []
-        st.rerun()
-
-active_color_map = {}
-active_emoji_map = {}
-for idx, v_name in enumerate(st.session_state.storage_voelker):
-    # Farb-Pool nutzen
-    farb_code, icon = FARB_POOL[idx % len(FARB_POOL)]
-    active_color_map[v_name] = farb_code
-    active_emoji_map[v_name] = icon
-
-cols = st.columns(10)
-for i, volk_name in enumerate(alle_voelker):
-    with cols[i % 10]:
-        ist_aktiv = (volk_name in st.session_state.storage_voelker)
-        st.image("VolkLogo.jpg", use_container_width=True)
-        label = f"{active_emoji_map[volk_name]} {volk_name}" if ist_aktiv else volk_name
+
+# --- 4./5. AUSWAHL & ANALYSE ---
+# Als Fragment: Klicks auf Völker, Metriken und Optionen rendern nur diesen Teil neu,
+# nicht Kopfbereich, CSS, Upload und Export.
+# Im Live-Modus läuft nur dieses Fragment regelmäßig neu und holt sich den aktuellen Datensatz.
+LIVE = file_to_load == DEFAULT_FILE and st.session_state.get('live_modus', False)
+
+@st.fragment(run_every=LIVE_INTERVALL_S if LIVE else None)
+def voelker_und_analyse(daten):
+    messung.eintraege.pop("5b. Plotly-Ausgabe", None)  # nicht von einer älteren Figur stehen lassen
+    if LIVE:
+        # Nur mtime/Größe prüfen; bei Zuwachs werden nur die angehängten Bytes gelesen
+        daten, aus_cache = lade_daten(DEFAULT_FILE)
+        if not aus_cache: st.toast(f"🔄 {DEFAULT_FILE} aktualisiert")
+    # --- 4. VÖLKERAUSWAHL ---
+    with messung.abschnitt("4. Völkerauswahl") as eintrag:
+        # Standort: bei nur einem gleich dessen Völker, sonst zuerst die Übersicht (None)
+        standorte = daten.standorte.namen
+        if st.session_state.storage_standort is not None and st.session_state.storage_standort not in standorte:
+            st.session_state.storage_standort = standorte[0] if len(standorte) == 1 else None
+        standort = st.session_state.storage_standort
+        uebersicht = standort is None
+
+        if uebersicht:
+            st.write("### Standorte")
+            # Leere Datei (nur Kopfzeile): keine Standorte, st.columns(0) wäre ein Fehler
+            s_cols = st.columns(min(len(standorte), 10)) if standorte else []
+            if not standorte: st.info("Keine Einträge in den Daten.")
+            for i, name in enumerate(standorte):
+                s_cols[i % 10].button(f"📍 {name} ({len(daten.standorte.voelker[name])})", key=f"std_{name}",
+                                      use_container_width=True, on_click=standort_waehlen, args=(name, daten.standorte.voelker[name]))
+            alle_voelker = []
+        else:
+            if len(standorte) > 1:
+                t_col, z_col = st.columns([0.8, 0.2], vertical_alignment="bottom")
+                t_col.write(f"### Schnellzugriff Völker – 📍 {standort}")
+                z_col.button("⬅️ Alle Standorte", use_container_width=True, on_click=standort_waehlen, args=(None,))
+            else:
+                st.write("### Schnellzugriff Völker")
+            alle_voelker = daten.standorte.voelker[standort]
+        # Logo einmal laden + verkleinern; gleiche Bytes = gleiche Media-URL, der Browser lädt es nur einmal
+        volk_logo = lade_bild("VolkLogo.jpg", breite=VOLK_LOGO_BREITE)
+        # Export im Kopf liest beim Klick die aktuelle Auswahl von hier
+        st.session_state.export_ansicht.update(voelker=list(st.session_state.storage_voelker), zeit=st.session_state.storage_zeit,
+                                               daten=daten)  # im Live-Modus evtl. neuer als der Kopfbereich
+
+        if alle_voelker:
+            c_all, c_none, c_dummy = st.columns([0.2, 0.2, 0.6])
+            with c_all:
+                st.button("✅ Alle auswählen", use_container_width=True, on_click=alle_auswaehlen, args=(alle_voelker,))
+            with c_none:
+                st.button("❌ Auswahl leeren", use_container_width=True, on_click=auswahl_leeren)
+
+        emojis = daten.register.emojis  # fest je Volk, unabhängig von der Klick-Reihenfolge
+
+        cols = st.columns(10)
+        for i, volk_name in enumerate(alle_voelker):
+            with cols[i % 10]:
+                ist_aktiv = (volk_name in st.session_state.storage_voelker)
+                st.image(volk_logo, use_container_width=True)
+                label = f"{emojis[volk_name]} {volk_name}" if ist_aktiv else volk_name
         
-        if st.button(label, key=f"btn_{volk_name}", use_container_width=True, type="primary" if ist_aktiv else "secondary"):
-            if ist_aktiv: st.session_state.storage_voelker.remove(volk_name)
-            else: st.session_state.storage_voelker.append(volk_name)
-            st.rerun()
-
-# --- 5. ANALYSE ---
-if st.session_state.storage_voelker:
-    st.markdown("<hr style='margin: 5px 0; border: none; border-top: 1px solid rgba(255,255,255,0.2);'>", unsafe_allow_html=True)
-    
-    # 🟢 HIER IST DIE NEUE BESCHRIFTUNG
-    metriken = {"Gewicht": "Gewicht", "Zunahme/Abnahme": "Gewicht_Diff", "Varroa (Milben/Tag)": "Milben", "Volksstärke": "Bewertung Volksstärke"}
+                st.button(label, key=f"btn_{volk_name}", use_container_width=True, type="primary" if ist_aktiv else "secondary",
+                          on_click=volk_umschalten, args=(volk_name,))
+        eintrag['voelker'] = len(alle_voelker)
+
+    # --- 5. ANALYSE ---
+    with messung.abschnitt("5. Analyse") as eintrag:
+        if uebersicht or st.session_state.storage_voelker:
+            st.markdown("<hr style='margin: 5px 0; border: none; border-top: 1px solid rgba(255,255,255,0.2);'>", unsafe_allow_html=True)
     
-    m_cols = st.columns(4)
-    for i, label in enumerate(metriken.keys()):
-        aktiv = (st.session_state.storage_metrik == label)
-        if m_cols[i].button(label, key=f"m_{label}", use_container_width=True, type="primary" if aktiv else "secondary"):
-            st.session_state.storage_metrik = label
-            st.rerun()
-
-    opt_col1, opt_col2 = st.columns([1, 4])
+            m_cols = st.columns(len(METRIKEN))
+            for i, label in enumerate(METRIKEN.keys()):
+                aktiv = (st.session_state.storage_metrik == label)
+                m_cols[i].button(label, key=f"m_{label}", use_container_width=True, type="primary" if aktiv else "secondary",
+                                 on_click=metrik_setzen, args=(label,))
+
+            opt_col1, opt_col2 = st.columns([1, 4])
     
-    with opt_col1:
-        st.write("#### ⚙️ Optionen")
+            with opt_col1:
+                st.write("#### ⚙️ Optionen")
         
-        verfuegbare_jahre = sorted(df['Datum des Eintrags'].dt.year.unique(), reverse=True)
-        jahre_str = [str(j) for j in verfuegbare_jahre]
+                verfuegbare_jahre = daten.volk_index.jahre[::-1]  # beim Laden aus den Saison-Grenzen bestimmt
+                jahre_str = [str(j) for j in verfuegbare_jahre]
         
-        standard_opts = ["Alles anzeigen", "Letzte 6 Monate", "Letzte 3 Monate", "Letzte 30 Tage", "Letzte 14 Tage", "Letzte 7 Tage"]
-        alle_optionen = standard_opts + jahre_str
+                standard_opts = ["Alles anzeigen", "Letzte 6 Monate", "Letzte 3 Monate", "Letzte 30 Tage", "Letzte 14 Tage", "Letzte 7 Tage"]
+                alle_optionen = standard_opts + jahre_str
         
-        try: z_index = alle_optionen.index(st.session_state.storage_zeit)
-        except: z_index = 1 
-        st.radio("Zeitraum:", alle_optionen, index=z_index, key="widget_zeit_key", on_change=save_zeit_change)
+                try: z_index = alle_optionen.index(st.session_state.storage_zeit)
+                except: z_index = 1 
+                st.radio("Zeitraum:", alle_optionen, index=z_index, key="widget_zeit_key", on_change=save_zeit_change)
         
-        c_opts = ["Liniendiagramm", "Balkendiagramm"]
-        try: c_index = c_opts.index(st.session_state.storage_chart)
-        except: c_index = 0
-        st.radio("Typ:", c_opts, index=c_index, key="widget_chart_key", on_change=save_chart_change)
+                c_opts = ["Liniendiagramm", "Balkendiagramm"]
+                try: c_index = c_opts.index(st.session_state.storage_chart)
+                except: c_index = 0
+                st.radio("Typ:", c_opts, index=c_index, key="widget_chart_key", on_change=save_chart_change)
         
-        st.write("---")
+                st.write("---")
         
-        st.checkbox("Leere Werte als '0' anzeigen", 
-                    value=st.session_state.storage_zeros, 
-                    key="widget_zeros_key", on_change=save_zeros_change,
-                    help="Wenn an: Leere Zellen werden als 0 gewertet.\nWenn aus: Tage ohne Eintrag werden ignoriert.")
-
-        st.checkbox("Zeitleiste stauchen", 
-                    value=st.session_state.storage_stauchung, 
-                    key="widget_stauchung_key", on_change=save_stauchung_change,
-                    help="Entfernt Lücken zwischen Einträgen.")
-
-    with opt_col2:
-        aktuelle_voelker = st.session_state.storage_voelker
-        plot_df = df[df['Stockname'].isin(aktuelle_voelker)].copy().sort_values("Datum des Eintrags")
-        heute = pd.Timestamp.now().normalize()
-
-        days_map = {"Letzte 7 Tage": 7, "Letzte 14 Tage": 14, "Letzte 30 Tage": 30, "Letzte 3 Monate": 90, "Letzte 6 Monate": 180}
-        auswahl = st.session_state.storage_zeit
+                l_opts = list(LUECKEN_POLITIK)
+                try: l_index = l_opts.index(st.session_state.storage_luecken)
+                except: l_index = 0
+                st.radio("Leere Werte:", l_opts, index=l_index, key="widget_luecken_key", on_change=save_luecken_change,
+                         help="Auslassen: Einträge ohne Wert werden ignoriert.\nAls 0: leere Zellen zählen als 0.\n"
+                              "Halten/Interpolieren: je Volk aus den Nachbarwerten, nie über eine längere Pause hinweg.")
+
+                st.checkbox("Zeitleiste stauchen", 
+                            value=st.session_state.storage_stauchung, 
+                            key="widget_stauchung_key", on_change=save_stauchung_change,
+                            help="Entfernt Lücken zwischen Einträgen.")
+
+                st.checkbox("Alle Rohdaten anzeigen", 
+                            value=st.session_state.storage_rohdaten, 
+                            key="widget_rohdaten_key", on_change=save_rohdaten_change,
+                            help="Wenn aus: Lange Zeiträume werden für eine flüssige Anzeige verdichtet.")
+
+                st.checkbox("Völker vergleichen",
+                            value=st.session_state.storage_vergleich,
+                            key="widget_vergleich_key", on_change=save_vergleich_change,
+                            help="Korrelation der Metrik zwischen den gewählten Völkern (Wochenwerte) und Rangliste zum Median.")
+
+            with opt_col2:
+                heute = pd.Timestamp.now().normalize()
+                ansicht = {feld: st.session_state[f"storage_{feld}"] for feld in ANSICHT_FELDER}
+                # Reihenfolge der Klicks ändert die Figur nicht -> gleiche Auswahl, gleicher Cache-Eintrag
+                ansicht['voelker'] = daten.register.sortiert(ansicht['voelker'])
+                # Alles, wovon die Figur abhängt
+                schluessel = (daten.schluessel, heute) + tuple(
+                    tuple(wert) if isinstance(wert, list) else wert for wert in ansicht.values())
         
-        start_date = None
-        end_date = heute + pd.Timedelta(days=1) 
-
-        if auswahl in days_map:
-            start_date = heute - pd.Timedelta(days=days_map[auswahl])
-            plot_df = plot_df[plot_df['Datum des Eintrags'] >= start_date]
-        elif auswahl.isdigit(): 
-            wahl_jahr = int(auswahl)
-            start_date = pd.Timestamp(year=wahl_jahr, month=1, day=1)
-            end_date = pd.Timestamp(year=wahl_jahr, month=12, day=31)
-            plot_df = plot_df[plot_df['Datum des Eintrags'].dt.year == wahl_jahr]
-
-        y_spalte = "Gewicht"
-        metrik = st.session_state.storage_metrik
+                cache = figur_cache()
+                ergebnis = cache.hole(schluessel)
+                figur_treffer = ergebnis is not None
+                if ergebnis is None:
+                    if uebersicht:
+                        ergebnis = baue_standort_diagramm(daten, ansicht, heute)
+                    elif ansicht['vergleich']:
+                        ergebnis = baue_vergleich(daten, ansicht, heute)
+                    else:
+                        ergebnis = baue_diagramm(daten, ansicht, heute)
+                    cache.lege_ab(schluessel, ergebnis, ergebnis['groesse'])
         
-        # --- DATENAUFBEREITUNG ---
-        if metrik == "Zunahme/Abnahme":
-            plot_df['Gewicht_Diff'] = plot_df.groupby('Stockname')['Gewicht'].diff()
-            y_spalte = "Gewicht_Diff"
-            if st.session_state.storage_zeros:
-                plot_df[y_spalte] = plot_df[y_spalte].fillna(0)
-            
-        elif metrik == "Varroa (Milben/Tag)": 
-            y_spalte = "Milben"
-            if st.session_state.storage_zeros:
-                plot_df[y_spalte] = plot_df[y_spalte].fillna(0)
-            
-        elif metrik == "Volksstärke": 
-            y_spalte = "Bewertung Volksstärke"
-            if y_spalte in plot_df.columns and st.session_state.storage_zeros:
-                plot_df[y_spalte] = plot_df[y_spalte].fillna(0)
-
-        if y_spalte in plot_df.columns:
-            plot_df = plot_df.dropna(subset=[y_spalte])
-
-        if not plot_df.empty and y_spalte in plot_df.columns:
-            vorhandene_im_plot = plot_df['Stockname'].unique()
-            fehlende = [v for v in aktuelle_voelker if v not in vorhandene_im_plot]
-            if fehlende:
-                fehlende_labels = [f"**{active_emoji_map[v]} {v}**" for v in fehlende]
-                st.warning(f"⚠️ Keine Daten für {metrik} im gewählten Zeitraum: {', '.join(fehlende_labels)}")
-
-        if not plot_df.empty and y_spalte in plot_df.columns:
-            if start_date:
-                info_text = f"📅 Filter-Zeitraum: {start_date.strftime('%d.%m.%Y')} bis {end_date.strftime('%d.%m.%Y')}"
-            else:
-                info_text = "📅 Filter-Zeitraum: Alle verfügbaren Daten"
-            st.caption(info_text)
-
-            # PODEST-TRICK (Volksstärke)
-            if metrik == "Volksstärke":
-                plot_df[y_spalte] = plot_df[y_spalte] + 1
-
-            # 🟢 REIHENFOLGE DER VÖLKER (HARD SORT)
-            sortierte_voelker = sorted(plot_df['Stockname'].unique(), key=natural_sort_key)
-            plot_df['Stockname'] = pd.Categorical(plot_df['Stockname'], categories=sortierte_voelker, ordered=True)
-            plot_df = plot_df.sort_values(by=['Datum des Eintrags', 'Stockname'])
-
-            # --- PLOT ---
-            if not st.session_state.storage_stauchung:
-                # 🔵 MODUS NORMAL
-                if st.session_state.storage_chart == "Liniendiagramm":
-                    fig = px.line(plot_df, x='Datum des Eintrags', y=y_spalte, color='Stockname', 
-                                  color_discrete_map=active_color_map, template="plotly_dark", markers=True,
-                                  category_orders={'Stockname': sortierte_voelker})
-                    fig.update_traces(line=dict(width=3), marker=dict(size=8, line=dict(width=1, color='white')))
-                else:
-                    fig = px.bar(plot_df, x='Datum des Eintrags', y=y_spalte, color='Stockname', 
-                                 color_discrete_map=active_color_map, barmode='group', template="plotly_dark",
-                                 category_orders={'Stockname': sortierte_voelker})
-                    fig.update_layout(bargap=0.1, bargroupgap=0.05)
-                
-                x_axis_config = dict(
-                    title=None, showgrid=False, zeroline=False,
-                    ticklabelmode="period", dtick="M1", tickformat="%b %y"
-                )
-                if start_date: x_axis_config['range'] = [start_date, end_date]
-
-                x_min = start_date if start_date else plot_df['Datum des Eintrags'].min()
-                x_max = end_date if start_date else plot_df['Datum des Eintrags'].max()
-                monats_raster = pd.date_range(start=x_min - pd.Timedelta(days=32), end=x_max + pd.Timedelta(days=32), freq='MS')
-                for i, m_start in enumerate(monats_raster[:-1]):
-                    if m_start.month % 2 == 0:
-                        fig.add_vrect(x0=m_start, x1=monats_raster[i+1], fillcolor="rgba(255,255,255,0.05)", layer="below", line_width=0)
-
-            else:
-                # 🔴 MODUS GESTAUCHT
-                plot_df['Datum_Label'] = plot_df['Datum des Eintrags'].dt.strftime('%d.%m.%y')
-                sorted_labels = plot_df['Datum_Label'].unique()
-                
-                if st.session_state.storage_chart == "Liniendiagramm":
-                    fig = px.line(plot_df, x='Datum_Label', y=y_spalte, color='Stockname', 
-                                  color_discrete_map=active_color_map, template="plotly_dark", markers=True,
-                                  category_orders={'Stockname': sortierte_voelker})
-                    fig.update_traces(line=dict(width=3), marker=dict(size=8, line=dict(width=1, color='white')))
-                else:
-                    fig = px.bar(plot_df, x='Datum_Label', y=y_spalte, color='Stockname', 
-                                 color_discrete_map=active_color_map, barmode='group', template="plotly_dark",
-                                 category_orders={'Stockname': sortierte_voelker})
-                    fig.update_layout(bargap=0.1, bargroupgap=0.05)
-                
-                x_axis_config = dict(
-                    title=None, showgrid=False, type='category',
-                    categoryorder='array', categoryarray=sorted_labels
-                )
-                
-                unique_dates = plot_df['Datum_Label'].unique()
-                for i in range(len(unique_dates)):
-                    if i % 2 == 0: 
-                        fig.add_vrect(x0=i-0.5, x1=i+0.5, fillcolor="rgba(255,255,255,0.05)", layer="below", line_width=0)
-
-            # ACHSE MIT TEXT (ANGEPASSTE WERTE)
-            y_axis_config = dict(title=metrik, gridcolor="rgba(255,255,255,0.1)")
-            
-            if metrik == "Volksstärke":
-                y_axis_config.update(dict(
-                    tickmode='array',
-                    tickvals=[1, 2, 3], 
-                    ticktext=['Schwach', 'Normal', 'Stark'],
-                    range=[0.5, 3.1]
-                ))
-
-            fig.update_layout(
-                xaxis=x_axis_config,
-                yaxis=y_axis_config,
-                plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, title=None)
-            )
-            st.plotly_chart(fig, use_container_width=True)
+                for art, text in ergebnis['meldungen']:
+                    getattr(st, art)(text)
+                eintrag.update(figur="Treffer" if figur_treffer else "neu gebaut", figur_bytes=ergebnis['groesse'])
+                if ergebnis['fig'] is not None:
+                    with messung.abschnitt("5b. Plotly-Ausgabe"):
+                        st.plotly_chart(ergebnis['fig'], use_container_width=True)
+                if ergebnis.get('tabelle') is not None:
+                    st.dataframe(ergebnis['tabelle'], hide_index=True, use_container_width=True)
         else:
-            if y_spalte not in plot_df.columns:
-                 st.error(f"⚠️ Spalte '{y_spalte}' nicht gefunden. Bitte CSV prüfen.")
-            else:
-                 st.info(f"💡 Keine Daten für **'{metrik}'** im gewählten Zeitraum.")
-else:
-    st.info("👆 Bitte wähle oben ein oder mehrere Völker aus.")
+            st.info("👆 Bitte wähle oben ein oder mehrere Völker aus.")
+
+    if messung.aktiv:
+        with st.expander("🛠️ Messung (letzter Durchlauf)"):
+            st.dataframe(messung.tabelle(), hide_index=True, use_container_width=True)
+            st.caption(f"Verlauf in {MESS_LOG}")
 
+voelker_und_analyse(daten)
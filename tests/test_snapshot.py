@@ -0,0 +1,76 @@
+"""Parquet-Snapshot neben daten.csv: Anhängen, Neuaufbau und übernommene Upload-Einträge."""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pyarrow")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import imker_kern as k  # noqa: E402
+
+KOPF = "Datum des Eintrags,Stockname,Standortname,Gewicht,Notizen Eintrag\n"
+ZEILEN = [
+    "01.04.25 12:00,Volk 1,Stand A,20.5,\n",
+    "02.04.25 12:00,Volk 2,Stand A,18.0,\n",
+    "03.04.25 12:00,Volk 1,Stand A,21.0,\n",
+]
+UPLOAD = "04.04.25 09:30,Volk 3,Stand B,15.5,nur im Upload\n"
+
+def schreibe(pfad, zeilen, modus='w'):
+    with open(pfad, modus, encoding='utf-8') as f:
+        f.write(("" if modus == 'a' else KOPF) + "".join(zeilen))
+
+def eintraege(pfad):
+    df = k.lade_basisdaten(str(pfad))
+    return sorted(zip(df['Stockname'].astype(str), df['Datum des Eintrags'], df['Gewicht'].astype('float64').round(2)))
+
+def test_uebernommene_eintraege_ueberstehen_umgeschriebene_csv(tmp_path):
+    csv_pfad = tmp_path / "daten.csv"
+    schreibe(csv_pfad, ZEILEN)
+    assert len(eintraege(csv_pfad)) == 3
+
+    upload = tmp_path / "upload.csv"
+    schreibe(upload, [ZEILEN[0], UPLOAD])
+    assert k.uebernimm_in_basisdaten(str(csv_pfad), k.lade_csv(str(upload))) == 1
+    assert len(eintraege(csv_pfad)) == 4
+
+    # Sync-Job hängt an, dann schreibt er die Datei um (eine Zelle korrigiert)
+    schreibe(csv_pfad, ["05.04.25 12:00,Volk 2,Stand A,18.4,\n"], modus='a')
+    assert len(eintraege(csv_pfad)) == 5
+    korrigiert = [ZEILEN[0].replace("20.5", "20.75")] + ZEILEN[1:] + ["05.04.25 12:00,Volk 2,Stand A,18.4,\n"]
+    schreibe(csv_pfad, korrigiert)
+    daten = eintraege(csv_pfad)
+    assert len(daten) == 5
+    assert ("Volk 3", k.pd.Timestamp("2025-04-04"), 15.5) in daten
+    assert ("Volk 1", k.pd.Timestamp("2025-04-01"), 20.75) in daten
+    # gleich lange Korrektur: Datei wird nicht größer, ist aber geändert
+    korrigiert[1] = korrigiert[1].replace("18.0", "18.5")
+    schreibe(csv_pfad, korrigiert)
+    assert ("Volk 2", k.pd.Timestamp("2025-04-02"), 18.5) in eintraege(csv_pfad)
+
+    # Steht der übernommene Eintrag später auch in der CSV, zählt er nur einmal
+    schreibe(csv_pfad, [UPLOAD], modus='a')
+    assert len(eintraege(csv_pfad)) == 5
+    # ... und eine aus der CSV gelöschte Zeile verschwindet auch aus dem Snapshot
+    schreibe(csv_pfad, korrigiert[1:] + [UPLOAD])
+    daten = eintraege(csv_pfad)
+    assert len(daten) == 4
+    assert [d[0] for d in daten].count("Volk 3") == 1
+    assert not k.lies_snapshot_meta(k.snapshot_pfad(str(csv_pfad))).get('uebernommen')
+
+def test_neuaufbau_liest_nur_bis_zum_stand(tmp_path):
+    csv_pfad = tmp_path / "daten.csv"
+    schreibe(csv_pfad, ZEILEN)
+    stand = k.datei_stand(str(csv_pfad))
+    # Während des Aufbaus kommt ein Satz dazu, der letzte ist noch halb geschrieben
+    schreibe(csv_pfad, ["05.04.25 12:00,Volk 2,Stand A,18.4,\n", "06.04.25 12:00,Vo"], modus='a')
+    k.baue_snapshot_neu(k.snapshot_pfad(str(csv_pfad)), str(csv_pfad), stand)
+    assert len(eintraege(csv_pfad)) == 4
+
+    schreibe(csv_pfad, ["lk 1,Stand A,22.0,\n"], modus='a')
+    assert eintraege(csv_pfad) == sorted(eintraege_aus_csv(csv_pfad))
+
+def eintraege_aus_csv(pfad):
+    df = k.lade_csv(str(pfad))
+    return list(zip(df['Stockname'].astype(str), df['Datum des Eintrags'], df['Gewicht'].astype('float64').round(2)))